@@ -0,0 +1,321 @@
+"""
+Benchmarks for the audio ingestion path.
+
+Generates synthetic OGG/Opus, MP3 and WAV recordings, serves them from a
+local HTTP server and measures, for every (format, file count, duration)
+case and in a fresh process:
+
+- `create_audio_from_links` download time
+- `AudioHandler.ahandle` time, through the process pool and its queue
+  or the passthrough thread exactly as the bot runs it
+- peak RSS of the process and of its ffmpeg children
+
+Results are written as JSON and can be compared with a previous run:
+
+    python benchmarks/bench_audio.py --output bench.json
+    python benchmarks/bench_audio.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "to_do_bot"))
+
+DEFAULT_DURATIONS = [10, 60, 600, 3600]
+DEFAULT_FILE_COUNTS = [1, 5, 20]
+DEFAULT_FORMATS = ["ogg", "mp3", "wav"]
+SAMPLE_RATE = 48000
+SYNTHESIS_BLOCK = 60 * SAMPLE_RATE
+# ffmpeg export settings close to what Telegram clients send
+EXPORT_PARAMETERS = {
+    "ogg": {"format": "ogg", "codec": "libopus", "bitrate": "32k"},
+    "mp3": {"format": "mp3", "bitrate": "128k"},
+    "wav": {"format": "wav"},
+}
+
+
+def synthetic_speech(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+    Speech-like mono s16 signal: syllable-rate modulated harmonics with
+    pauses and a low noise floor, so VAD and codecs behave realistically.
+
+    Generated in blocks in float64: the phase of an hour of audio does not
+    fit float32 precision, and only one block of floats is held at a time.
+    """
+    rng = np.random.default_rng(seed)
+    samples = int(seconds * SAMPLE_RATE)
+    # Roughly 30% pauses in 0.5-2 s stretches
+    gate = np.ones(samples, dtype=np.bool_)
+    position = 0
+    while position < samples:
+        position += int(rng.uniform(2, 6) * SAMPLE_RATE)
+        pause = int(rng.uniform(0.5, 2) * SAMPLE_RATE)
+        gate[position : position + pause] = False
+        position += pause
+
+    output = np.empty(samples, dtype=np.int16)
+    phase_start = 0.0
+    for start in range(0, samples, SYNTHESIS_BLOCK):
+        end = min(start + SYNTHESIS_BLOCK, samples)
+        t = np.arange(start, end, dtype=np.float64) / SAMPLE_RATE
+        pitch = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+        phase = phase_start + 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+        # Harmonics are whole multiples, so the phase can wrap at 2 pi
+        phase_start = phase[-1] % (2 * np.pi)
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        syllables = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+        signal = voice * syllables * gate[start:end] * 6000
+        signal += rng.normal(0, 40, end - start)
+        output[start:end] = np.clip(signal, -32768, 32767)
+    return output
+
+
+def generate_inputs(work_dir: Path, formats: list[str], durations: list[int]):
+    """Create one file per (format, duration), reused across runs"""
+    from pydub import AudioSegment
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    for seconds in durations:
+        segment = None
+        for audio_format in formats:
+            path = work_dir / f"speech_{seconds}s.{audio_format}"
+            if path.exists():
+                continue
+            if segment is None:
+                segment = AudioSegment(
+                    synthetic_speech(seconds).tobytes(),
+                    frame_rate=SAMPLE_RATE,
+                    sample_width=2,
+                    channels=1,
+                )
+            print(f"Generating {path.name}", file=sys.stderr)
+            segment.export(path, **EXPORT_PARAMETERS[audio_format])
+
+
+async def _run_case(base_url: str, case: dict) -> dict:
+    from src.audio_handler import AudioHandler, create_audio_from_links
+
+    links = [
+        f"{base_url}/speech_{case['file_duration']}s.{case['format']}"
+        for _ in range(case["files"])
+    ]
+    started = time.perf_counter()
+    audios = await create_audio_from_links(links)
+    download = time.perf_counter() - started
+
+    handler = AudioHandler(
+        AUDIO_USE_PROCESS_POOL=case["process_pool"],
+        AUDIO_STREAM_DECODE_THRESHOLD=case["stream_decode_threshold"],
+    )
+    handler.start()
+    try:
+        if handler._executor is not None:
+            # The bot keeps its pool alive, worker spawn is not part of a job
+            await asyncio.get_running_loop().run_in_executor(handler._executor, int)
+        started = time.perf_counter()
+        audio = await handler.ahandle(audios)
+        process = time.perf_counter() - started
+    finally:
+        handler.stop()
+
+    result = {
+        "download_s": download,
+        "process_s": process,
+        "input_bytes": sum(len(file) for file in audios.files),
+        "output_bytes": len(audio),
+        "output_format": audio.format,
+    }
+    audios.close()
+    audio.close()
+    return result
+
+
+# ru_maxrss is in KiB on Linux and bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _peak_rss() -> int:
+    """
+    Peak resident size of this process in bytes.
+
+    On Linux ru_maxrss survives fork and exec, so a worker would report the
+    parent's peak; VmHWM belongs to the new address space only.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def _case_worker(base_url: str, case: dict, queue) -> None:
+    try:
+        result = asyncio.run(_run_case(base_url, case))
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        result["peak_rss_mb"] = _peak_rss() / 2**20
+        result["peak_child_rss_mb"] = children * _MAXRSS_UNIT / 2**20
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def run_case(base_url: str, case: dict, repeat: int) -> dict:
+    """Run a case `repeat` times in fresh processes and keep medians"""
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        queue = context.Queue()
+        process = context.Process(target=_case_worker, args=(base_url, case, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if "error" in result:
+            return {**case, "error": result["error"]}
+        runs.append(result)
+
+    summary = {**case, "runs": len(runs)}
+    for key, value in runs[0].items():
+        if isinstance(value, float):
+            summary[key] = statistics.median(run[key] for run in runs)
+        else:
+            summary[key] = value
+    return summary
+
+
+async def serve(work_dir: Path):
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_static("/", work_dir)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(case: dict) -> tuple:
+    return case["format"], case["files"], case["file_duration"]
+
+
+def compare(current: dict, baseline: dict) -> str:
+    """Per-case relative change of timings and memory"""
+    metrics = ["download_s", "process_s", "peak_rss_mb"]
+    previous = {case_key(case): case for case in baseline["results"]}
+    lines = [f"{'case':<24}" + "".join(f"{metric:>22}" for metric in metrics)]
+    for case in current["results"]:
+        old = previous.get(case_key(case))
+        if old is None or "error" in case or "error" in old:
+            continue
+        name = f"{case['format']} {case['files']}x{case['file_duration']}s"
+        cells = []
+        for metric in metrics:
+            change = (case[metric] - old[metric]) / old[metric] if old[metric] else 0
+            cells.append(f"{old[metric]:8.2f} -> {case[metric]:8.2f} {change:+5.0%}")
+        lines.append(f"{name:<24}" + "".join(f"{cell:>22}" for cell in cells))
+    return "\n".join(lines)
+
+
+async def main(args: argparse.Namespace) -> dict:
+    work_dir = Path(args.work_dir)
+    generate_inputs(work_dir, args.formats, args.durations)
+    runner, base_url = await serve(work_dir)
+    results = []
+    try:
+        for audio_format in args.formats:
+            for files in args.files:
+                for duration in args.durations:
+                    if files * duration > args.max_total:
+                        continue
+                    case = {
+                        "format": audio_format,
+                        "files": files,
+                        "file_duration": duration,
+                        "stream_decode_threshold": args.stream_decode_threshold,
+                        "process_pool": not args.no_process_pool,
+                    }
+                    print(f"Running {case}", file=sys.stderr)
+                    results.append(
+                        await asyncio.to_thread(run_case, base_url, case, args.repeat)
+                    )
+    finally:
+        await runner.cleanup()
+
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS)
+    parser.add_argument("--durations", nargs="+", type=int, default=DEFAULT_DURATIONS)
+    parser.add_argument("--files", nargs="+", type=int, default=DEFAULT_FILE_COUNTS)
+    parser.add_argument(
+        "--max-total",
+        type=int,
+        default=3600,
+        help="Skip cases longer than this many seconds in total",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stream-decode-threshold", type=int, default=2 * 1024 * 1024)
+    parser.add_argument(
+        "--no-process-pool",
+        action="store_true",
+        help="Decode in a thread, as with AUDIO_USE_PROCESS_POOL=false",
+    )
+    parser.add_argument("--work-dir", default=str(ROOT / ".bench_data"))
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Previous JSON report to compare with")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(compare(report, baseline), file=sys.stderr)
@@ -0,0 +1,175 @@
+"""
+Benchmark of STT result parsing.
+
+Builds synthetic Salute result files with a given number of utterances
+and compares, per size:
+
+- `eager`: json.loads and a validated `TranscriptionItem` per utterance
+  (the previous path)
+- `lazy`: `parse_transcription`, text read from the raw payload
+- `lazy_full`: `parse_transcription` and then every full model built
+
+Each step also covers joining the text, and shifting timestamps the way
+`merge_chunks` does for chunked recordings:
+
+    python benchmarks/bench_stt_parse.py --output bench_stt.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "to_do_bot"))
+
+DEFAULT_SIZES = [100, 1000, 10000, 40000]
+WORDS = "сегодня нужно отправить отчет и созвониться с командой по проекту".split()
+
+
+def synthetic_result(utterances: int, channels: int = 1) -> bytes:
+    """
+    Salute result file, one utterance per ~3 s with word alignments,
+    repeated for every channel.
+    """
+    items = []
+    for channel, index in itertools.product(range(channels), range(utterances)):
+        start = index * 3.0
+        words = [
+            {
+                "word": word,
+                "start": f"{start + 0.25 * position:.3f}s",
+                "end": f"{start + 0.25 * position + 0.2:.3f}s",
+            }
+            for position, word in enumerate(WORDS)
+        ]
+        text = " ".join(WORDS)
+        items.append(
+            {
+                "results": [
+                    {
+                        "text": text,
+                        "normalized_text": text.capitalize() + ".",
+                        "start": f"{start:.3f}s",
+                        "end": f"{start + 2.8:.3f}s",
+                        "word_alignments": words,
+                    }
+                ],
+                "eou": True,
+                "emotions_result": {
+                    "positive": 0.1,
+                    "neutral": 0.8,
+                    "negative": 0.1,
+                },
+                "processed_audio_start": f"{start:.3f}s",
+                "processed_audio_end": f"{start + 3.0:.3f}s",
+                "backend_info": {
+                    "model_name": "general",
+                    "model_version": "1.0",
+                    "server_version": "1.0",
+                },
+                "channel": channel,
+                "speaker_info": {"speaker_id": -1, "main_speaker_confidence": 1.0},
+                "eou_reason": "ORGANIC",
+                "insight": "",
+                "person_identity": {
+                    "age": "AGE_NONE",
+                    "gender": "GENDER_NONE",
+                    "age_score": 0.0,
+                    "gender_score": 0.0,
+                },
+            }
+        )
+    return json.dumps(items, ensure_ascii=False).encode()
+
+
+def run_eager(payload: bytes) -> str:
+    from src.schemas import TranscriptionItem
+
+    items = [TranscriptionItem(**item) for item in json.loads(payload)]
+    items = [item.remap(lambda seconds: seconds + 60) for item in items]
+    return " ".join(item.results[0].text for item in items)
+
+
+def run_lazy(payload: bytes) -> str:
+    from src.schemas import parse_transcription
+
+    items = [
+        item.remap(lambda seconds: seconds + 60)
+        for item in parse_transcription(payload)
+    ]
+    return " ".join(item.text for item in items)
+
+
+def run_lazy_full(payload: bytes) -> str:
+    from src.schemas import parse_transcription
+
+    items = [
+        item.remap(lambda seconds: seconds + 60)
+        for item in parse_transcription(payload)
+    ]
+    return " ".join(item.results[0].text for item in items)
+
+
+PATHS = {"eager": run_eager, "lazy": run_lazy, "lazy_full": run_lazy_full}
+
+
+def measure(func, payload: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(payload)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(args: argparse.Namespace) -> dict:
+    results = []
+    for size in args.sizes:
+        payload = synthetic_result(size)
+        texts = {name: func(payload) for name, func in PATHS.items()}
+        if len(set(texts.values())) != 1:
+            raise RuntimeError(f"Parsers disagree on {size} utterances")
+        case = {"utterances": size, "payload_bytes": len(payload)}
+        for name, func in PATHS.items():
+            case[f"{name}_s"] = measure(func, payload, args.repeat)
+        case["speedup"] = case["eager_s"] / case["lazy_s"]
+        print(
+            f"{size:>7} utterances: eager {case['eager_s']:.4f}s, "
+            f"lazy {case['lazy_s']:.4f}s ({case['speedup']:.1f}x), "
+            f"lazy_full {case['lazy_full_s']:.4f}s",
+            file=sys.stderr,
+        )
+        results.append(case)
+
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    output = json.dumps(main(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
@@ -0,0 +1,176 @@
+"""
+Local stand-in for the Salute Speech API.
+
+Serves the OAuth, upload, async recognize, task status and download
+endpoints used by `SaluteSpeechHandler`, one account per port. Results
+are synthetic transcripts; recognition takes `--realtime-factor` of the
+uploaded audio duration, some tasks can be made to hang and requests to
+fail, to exercise routing, hedging, retries and concurrency limits:
+
+    python benchmarks/salute_stub.py --ports 9101 9102 --stuck-ratio 0.3
+
+and point the bot at it:
+
+    SALUTE_ACCOUNTS='[
+        {"name": "a", "credentials": "a",
+         "url_access_token": "http://127.0.0.1:9101/oauth",
+         "url_rest": "http://127.0.0.1:9101/rest/v1"},
+        {"name": "b", "credentials": "b",
+         "url_access_token": "http://127.0.0.1:9102/oauth",
+         "url_rest": "http://127.0.0.1:9102/rest/v1"}
+    ]'
+    STT_HEDGE_FACTOR=3 STT_HEDGE_MIN_DELAY=5
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_stt_parse import synthetic_result  # noqa: E402
+
+# 16 kHz mono s16, close enough for compressed uploads as well
+BYTES_PER_SECOND = 32000
+UTTERANCE_SECONDS = 3
+
+
+class StubAccount:
+    def __init__(self, name: str, args: argparse.Namespace) -> None:
+        self.name = name
+        self.args = args
+        self.uploads: dict[str, int] = {}
+        self.tasks: dict[str, tuple[float, float, int]] = {}
+        self.active = 0
+        self.requests = 0
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.requests += 1
+        if self.active >= self.args.max_concurrent:
+            raise web.HTTPTooManyRequests()
+        if random.random() < self.args.error_ratio:
+            raise web.HTTPInternalServerError()
+        self.active += 1
+        try:
+            await asyncio.sleep(self.args.latency)
+            return await handler(request)
+        finally:
+            self.active -= 1
+
+    async def oauth(self, request: web.Request) -> web.Response:
+        expires_at = (time.time() + self.args.token_ttl) * 1000
+        return web.json_response(
+            {"access_token": uuid.uuid4().hex, "expires_at": int(expires_at)}
+        )
+
+    async def upload(self, request: web.Request) -> web.Response:
+        size = 0
+        async for chunk in request.content.iter_any():
+            size += len(chunk)
+        file_id = uuid.uuid4().hex
+        self.uploads[file_id] = size
+        return web.json_response({"result": {"request_file_id": file_id}})
+
+    async def recognize(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        size = self.uploads.get(body["request_file_id"])
+        if size is None:
+            raise web.HTTPBadRequest(text="Unknown request_file_id")
+        # Packed recordings are transcribed per channel, in parallel
+        channels = body.get("options", {}).get("channels_count", 1)
+        duration = size / BYTES_PER_SECOND / channels
+        delay = duration * self.args.realtime_factor
+        if random.random() < self.args.stuck_ratio:
+            delay = float("inf")
+        task_id = uuid.uuid4().hex
+        self.tasks[task_id] = (time.monotonic() + delay, duration, channels)
+        print(
+            f"{self.name}: task {task_id} for {duration:.0f}s x {channels}",
+            file=sys.stderr,
+        )
+        return web.json_response({"result": {"id": task_id, "status": "NEW"}})
+
+    async def status(self, request: web.Request) -> web.Response:
+        task_id = request.query["id"]
+        if task_id not in self.tasks:
+            raise web.HTTPNotFound()
+        ready_at, _, _ = self.tasks[task_id]
+        if time.monotonic() < ready_at:
+            return web.json_response({"result": {"id": task_id, "status": "RUNNING"}})
+        return web.json_response(
+            {
+                "result": {
+                    "id": task_id,
+                    "status": "DONE",
+                    "response_file_id": task_id,
+                }
+            }
+        )
+
+    async def download(self, request: web.Request) -> web.Response:
+        task_id = request.query["response_file_id"]
+        if task_id not in self.tasks:
+            raise web.HTTPNotFound()
+        _, duration, channels = self.tasks[task_id]
+        utterances = max(1, int(duration // UTTERANCE_SECONDS))
+        return web.Response(
+            body=synthetic_result(utterances, channels),
+            content_type="application/octet-stream",
+        )
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware], client_max_size=2**31)
+        app.router.add_post("/oauth", self.oauth)
+        app.router.add_post("/rest/v1/data:upload", self.upload)
+        app.router.add_post("/rest/v1/speech:async_recognize", self.recognize)
+        app.router.add_get("/rest/v1/task:get", self.status)
+        app.router.add_get("/rest/v1/data:download", self.download)
+        return app
+
+
+async def serve(args: argparse.Namespace) -> None:
+    runners = []
+    for port in args.ports:
+        runner = web.AppRunner(StubAccount(f"stub:{port}", args).app())
+        await runner.setup()
+        await web.TCPSite(runner, args.host, port).start()
+        runners.append(runner)
+        print(f"Salute stub listening on http://{args.host}:{port}", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ports", nargs="+", type=int, default=[9101, 9102])
+    parser.add_argument("--realtime-factor", type=float, default=0.05)
+    parser.add_argument(
+        "--stuck-ratio", type=float, default=0.0, help="Tasks that never finish"
+    )
+    parser.add_argument(
+        "--error-ratio", type=float, default=0.0, help="Requests answered with 500"
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=10,
+        help="Requests in flight above this are answered with 429",
+    )
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--token-ttl", type=float, default=1800)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
@@ -1,22 +1,14 @@
-from typing import List
 from aiogram.types import Message
 from aiogram import Bot
 
 
 from keyboards import KeyboardEnum
-from src import TranscriptionItem, Result
+from src import LazyTranscriptionItem
 
 
-def adapter_salute_speech(data: list[TranscriptionItem]) -> str:
+def adapter_salute_speech(data: list[LazyTranscriptionItem]) -> str:
     """Convert transcription items to a single text string"""
-    res = []
-    results: list[List[Result]] = [x.results for x in data]
-    if not results:
-        return ""
-    for item in results:
-        [result] = item
-        res.append(f"{result.text}")
-    return " ".join(res)
+    return " ".join(item.text for item in data)
 
 
 def get_url(bot: Bot, file_path: str) -> str:
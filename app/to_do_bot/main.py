@@ -1,4 +1,5 @@
 import asyncio
+import itertools
 import logging
 import sys
 from os import getenv
@@ -19,8 +20,15 @@ from src import (
     init_bootstrap,
     create_audio_from_links,
     welcome_text,
-    TranscriptionItem,
+    LazyTranscriptionItem,
     AsyncInMemoryStore,
+    AdmissionControl,
+    StoredAudio,
+    probe_audio_link,
+    restore_timestamps,
+    merge_chunks,
+    JournalJob,
+    TranscriptCache,
 )
 
 
@@ -29,6 +37,8 @@ logger = logging.getLogger(__name__)
 logger.info("Starting bot...")
 
 dp = Dispatcher()
+# The event loop keeps only weak references to tasks
+RESUMED_JOBS: set[asyncio.Task] = set()
 
 
 load_dotenv()
@@ -79,7 +89,8 @@ async def handle_text(message: Message, state: FSMContext):
 
 async def handle_cancel(message: Message, state: FSMContext):
     """Handle cancellation of audio processing"""
-    await STORE.pop(message.chat.id)
+    for stored in await STORE.pop(message.chat.id) or []:
+        stored.cancel()
     await state.clear()
     await message.answer("Аудиозаписи удалены из обработки")
 
@@ -96,46 +107,200 @@ async def process_audio_with_text(message: Message, state: FSMContext):
 
     # Process audio files
     await message.answer("Началась обработка аудиозаписи(ей)")
-    transcription = await transcribe_audio_files(audio_list)
-    if not transcription:
-        await message.answer("Не удалось обработать аудиозаписи")
-        return
+    # Eager recognition started before a mode was chosen and is not journaled
+    job_id = None if EAGER_STT else JOURNAL.create_job(message.chat.id, message.text)
+    try:
+        sst_result = await transcribe_audio_files(audio_list, job_id)
+        transcription = adapter_salute_speech(sst_result) if sst_result else None
+        if not transcription:
+            await message.answer("Не удалось обработать аудиозаписи")
+            return
+
+        # Generate response based on selected action
+        llm_result = await generate_llm_response(message.text, sst_result)
+
+        # Send response to user
+        await send_formatted_response(message.chat.id, llm_result, transcription)
+    except asyncio.CancelledError:
+        # Interrupted by a shutdown, the job is resumed on the next start
+        job_id = None
+        raise
+    finally:
+        if job_id:
+            JOURNAL.finish_job(job_id)
+
+
+async def resume_jobs():
+    """Deliver results of STT jobs interrupted by a restart"""
+    for job in JOURNAL.pending_jobs():
+        task = asyncio.create_task(resume_job(job))
+        RESUMED_JOBS.add(task)
+        task.add_done_callback(RESUMED_JOBS.discard)
+
+
+async def resume_job(job: JournalJob):
+    """Finish one journaled job and send the result to its chat"""
+    logger.info(f"Resuming STT job {job.id} for chat {job.chat_id}")
+    try:
+        sst_result = None
+        if job.complete:
+            sst_result = await stt_handler.resume(job)
+        if sst_result:
+            if job.offset_map:
+                sst_result = [
+                    item.remap(job.offset_map.to_original) for item in sst_result
+                ]
+            transcription = adapter_salute_speech(sst_result)
+            llm_result = await generate_llm_response(job.mode, sst_result)
+            await send_formatted_response(job.chat_id, llm_result, transcription)
+        else:
+            await bot.send_message(
+                chat_id=job.chat_id,
+                text="Не удалось обработать аудиозаписи, отправьте их еще раз",
+            )
+    except asyncio.CancelledError:
+        raise
+    except Exception as _ex:
+        logger.error(f"Resuming job {job.id} failed: {_ex}", exc_info=True)
+    JOURNAL.finish_job(job.id)
+
+
+async def transcribe_audio_files(
+    audio_list: list[StoredAudio], job_id: str | None = None
+) -> list[LazyTranscriptionItem] | None:
+    """Transcribe audio files as one recording"""
+    cached = [cached_transcript(stored) for stored in audio_list]
+    if all(result is not None for result in cached):
+        logger.info(f"All {len(audio_list)} transcripts are cached")
+        sst_result = merge_chunks(list(zip(file_offsets(audio_list), cached)))
+    elif EAGER_STT:
+        # Recognition was started on receipt, files are transcribed one by one
+        tasks = [
+            stored.task or asyncio.create_task(transcribe_eagerly(stored))
+            for stored in audio_list
+        ]
+        results = await asyncio.gather(*tasks)
+        if any(result is None for result in results):
+            return None
+        sst_result = merge_chunks(list(zip(file_offsets(audio_list), results)))
+    else:
+        durations = [stored.duration for stored in audio_list]
+        duration = sum(durations) if all(durations) else None
+        sst_result = await recognize_links(
+            [await media_link(stored) for stored in audio_list], duration, job_id
+        )
+        if sst_result and len(audio_list) == 1:
+            cache_transcript(audio_list[0], sst_result)
+    logger.info(f"Transcript cache: {TRANSCRIPTS.stats()}")
+    logger.info(f"STT handler: {stt_handler.stats()}")
+
+    return sst_result
+
+
+async def transcribe_eagerly(stored: StoredAudio) -> list[LazyTranscriptionItem] | None:
+    """Background recognition of one file, errors are logged, not raised"""
+    try:
+        if (result := cached_transcript(stored)) is not None:
+            return result
+        result = await recognize_links([await media_link(stored)], stored.duration)
+        if result:
+            cache_transcript(stored, result)
+        return result
+    except asyncio.CancelledError:
+        raise
+    except Exception as _ex:
+        logger.error(f"Eager recognition failed: {_ex}", exc_info=True)
+        return None
+
+
+def file_offsets(audio_list: list[StoredAudio]):
+    """Start of every file in the recording they are joined into"""
+    return itertools.accumulate(
+        (stored.duration or 0 for stored in audio_list[:-1]), initial=0
+    )
+
+
+def cached_transcript(stored: StoredAudio) -> list[LazyTranscriptionItem] | None:
+    if stored.file_unique_id is None:
+        return None
+    return TRANSCRIPTS.get_transcript(TRANSCRIPTS.file_key(stored.file_unique_id))
 
-    # Generate response based on selected action
-    llm_result = await generate_llm_response(message.text, transcription)
 
-    # Send response to user
-    await send_formatted_response(message.chat.id, llm_result, transcription)
+def cache_transcript(stored: StoredAudio, items: list[LazyTranscriptionItem]):
+    if stored.file_unique_id is not None:
+        TRANSCRIPTS.put_transcript(
+            TRANSCRIPTS.file_key(stored.file_unique_id), items, stored.duration
+        )
 
 
-async def transcribe_audio_files(audio_list) -> list[TranscriptionItem] | str | None:
-    """Transcribe audio files and return the combined text"""
-    audio = await create_audio_from_links(audio_list)
-    logging.info(f"Created audio from links: {len(audio_list)} files")
+async def media_link(stored: StoredAudio) -> str:
+    """Direct link of a file, resolved late for ones that were cached"""
+    if stored.url is None:
+        file_info: File = await bot.get_file(stored.file_id)
+        stored.url = get_url(bot, file_info.file_path)
+    return stored.url
 
-    joined_audio = audio_handler.handle(audio)
-    logging.info(f"Joined audio size: {len(joined_audio) if joined_audio else 0}")
 
-    sst_result = await stt_handler.handle(joined_audio)
-    logging.info(
-        f"STT processing complete, results: {len(sst_result) if sst_result else 0}"
+async def recognize_links(
+    links: list[str], duration: float | None, job_id: str | None = None
+) -> list[LazyTranscriptionItem] | None:
+    """Download, join, trim and recognize files as one recording"""
+    audio = await create_audio_from_links(
+        links, duration=duration, downloader=downloader
     )
+    logging.info(f"Created audio from links: {len(links)} files")
 
-    return adapter_salute_speech(sst_result) if sst_result else None
+    joined_audio = trimmed_audio = None
+    try:
+        joined_audio = await audio_handler.ahandle(audio)
+        logging.info(f"Joined audio size: {len(joined_audio) if joined_audio else 0}")
 
+        # Same recording under another file id, e.g. uploaded again
+        content_key = await asyncio.to_thread(
+            TRANSCRIPTS.content_key, joined_audio.file
+        )
+        if (sst_result := TRANSCRIPTS.get_transcript(content_key)) is not None:
+            logging.info("Transcript found by audio content")
+            return sst_result
+
+        trimmed_audio = joined_audio
+        if vad.enabled:
+            trimmed_audio = await vad.ahandle(joined_audio)
+            logging.info(f"VAD removed {trimmed_audio.trimmed_seconds:.2f}s")
+
+        if job_id and trimmed_audio.offset_map:
+            JOURNAL.set_offset_map(job_id, trimmed_audio.offset_map)
+        sst_result = await stt_handler.handle(trimmed_audio, job_id)
+        logging.info(
+            f"STT processing complete, results: {len(sst_result) if sst_result else 0}"
+        )
+        if sst_result:
+            sst_result = restore_timestamps(sst_result, trimmed_audio)
+            TRANSCRIPTS.put_transcript(content_key, sst_result, joined_audio.duration)
+    finally:
+        # Buffers may be backed by temp files
+        audio.close()
+        for buffer in (joined_audio, trimmed_audio):
+            if buffer is not None:
+                buffer.close()
 
-async def generate_llm_response(action_text, transcription):
+    return sst_result
+
+
+async def generate_llm_response(action_text, sst_result, use_cache=True):
     """Generate LLM response based on the selected action"""
     logging.info(f"Selected action: {action_text}")
 
+    # Long transcripts are split on utterances, not mid-sentence
+    utterances = [item.text for item in sst_result]
     if action_text == KeyboardEnum.MAKE_TO_DO_LIST.value:
-        result = await llm.handle("task_summary", transcription)
+        result = await llm.summarize("task_summary", utterances, use_cache)
     elif action_text == KeyboardEnum.MAKE_WORKING_SUMMARIZE.value:
-        result = await llm.handle("day_summary", transcription)
+        result = await llm.summarize("day_summary", utterances, use_cache)
     else:
-        result = await llm.handle("simple_summary", transcription)
+        result = await llm.summarize("simple_summary", utterances, use_cache)
 
-    logging.info("LLM processing complete")
+    logging.info(f"LLM processing complete, cache: {llm.cache.stats()}")
     return result
 
 
@@ -176,19 +341,52 @@ async def handle_audio(message: Message, state: FSMContext):
     if curr_state != UserState.waiting_for_audio:
         await state.set_state(UserState.waiting_for_audio)
 
-    # Get file info and generate URL
-    file_id = message.voice.file_id if message.voice else message.audio.file_id
-    file_info: File = await bot.get_file(file_id)
-    file_path = file_info.file_path
-    media_url = get_url(bot, file_path)
+    media = message.voice or message.audio
+    media_url = None
+    # Telegram knows the real length, headers are only a fallback
+    duration = media.duration
+    if TRANSCRIPTS.file_key(media.file_unique_id) not in TRANSCRIPTS:
+        # Get file info and generate URL
+        file_info: File = await bot.get_file(media.file_id)
+        media_url = get_url(bot, file_info.file_path)
+
+        if not duration:
+            # Probe headers only, the file itself is downloaded on processing
+            try:
+                probe = await probe_audio_link(media_url, downloader=downloader)
+                duration = probe.duration
+                logger.info(f"Probed audio: {probe}")
+            except Exception as _ex:
+                logger.warning(f"Audio probe failed: {_ex}")
 
     # Store media URL for later processing
+    stored = StoredAudio(
+        url=media_url,
+        file_id=media.file_id,
+        file_unique_id=media.file_unique_id,
+        duration=duration,
+    )
     chat_id = message.chat.id
+    # Checked and stored at once, so notes sent together can't all pass
+    queued = await STORE.put_if(
+        chat_id,
+        stored,
+        lambda queued: ADMISSION.admit([audio.duration for audio in queued], duration),
+    )
+    if queued is None:
+        await message.answer(
+            "Аудио слишком длинное: суммарная длительность не должна превышать "
+            f"{ADMISSION.max_duration / 60:.0f} минут. Запись не добавлена.",
+            reply_markup=keyboard_with_extra,
+        )
+        return
+    if EAGER_STT and media_url:
+        stored.task = asyncio.create_task(transcribe_eagerly(stored))
 
-    await STORE.put(chat_id, media_url)
-
+    eta = ADMISSION.eta([*(audio.duration for audio in queued), duration])
     await message.answer(
-        "Аудио получено. Можете отправить еще или выбрать действие в клавиатуре.",
+        "Аудио получено. Можете отправить еще или выбрать действие в клавиатуре.\n"
+        f"Ожидаемое время обработки: ~{eta:.0f} сек.",
         reply_markup=keyboard_with_extra,
     )
 
@@ -216,18 +414,28 @@ async def handle_button(message: Message, state: FSMContext):
 
 async def main():
     """Main function to initialize components and start the bot"""
-    global llm, audio_handler, stt_handler, STORE, bot, MAX_TEXT_LENGTH
+    global llm, audio_handler, stt_handler, vad, downloader, JOURNAL
+    global STORE, ADMISSION, TRANSCRIPTS, bot
+    global MAX_TEXT_LENGTH, EAGER_STT
     MAX_TEXT_LENGTH = 4096
+    # Start recognition as soon as a file arrives, not on the button press
+    EAGER_STT = getenv("STT_EAGER", "false").lower() in ("1", "true", "yes")
     # Bot token from environment variable
     TOKEN = getenv("BOT_TOKEN")
 
     # In-memory storage for audio links
     STORE = AsyncInMemoryStore()
+    # Duration limit and ETA for received audio
+    ADMISSION = AdmissionControl()
+    # Transcripts of files seen before, by file id and by content
+    TRANSCRIPTS = TranscriptCache()
+    TRANSCRIPTS.start()
 
     # User states for FSM
 
     bot = Bot(token=TOKEN)
-    llm, audio_handler, stt_handler = init_bootstrap()
+    llm, audio_handler, stt_handler, vad, downloader, JOURNAL = init_bootstrap()
+    await resume_jobs()
 
     await dp.start_polling(bot)
 
@@ -1,10 +1,27 @@
-from src.schemas import TranscriptionItem, Result
+from src.schemas import (
+    TranscriptionItem,
+    LazyTranscriptionItem,
+    Result,
+    StoredAudio,
+    parse_transcription,
+)
+from src.admission import AdmissionControl
+from src.probe import ProbeResult
 from src._bootstrap import init_bootstrap
-from src.audio_handler import AudioHandler, create_audio_from_links
-from src.salute_speech_stt import SaluteSpeechHandler
+from src.audio_handler import (
+    AudioHandler,
+    create_audio_from_links,
+    probe_audio_link,
+)
+from src.salute_speech_stt import SaluteSpeechHandler, merge_chunks
 from src.llm import GigaChatLLM
+from src.token_estimator import TokenEstimator
 from src.static import welcome_text
 from src.store import AsyncInMemoryStore
+from src.downloader import Downloader, DownloadTooLargeError
+from src.journal import JobJournal, JournalJob
+from src.cache import ResponseCache, TranscriptCache
+from src.vad import VoiceActivityTrimmer, restore_timestamps
 
 
 __all__ = [
@@ -17,4 +34,20 @@ __all__ = [
     "Result",
     "welcome_text",
     "AsyncInMemoryStore",
+    "VoiceActivityTrimmer",
+    "restore_timestamps",
+    "AdmissionControl",
+    "ProbeResult",
+    "StoredAudio",
+    "probe_audio_link",
+    "Downloader",
+    "DownloadTooLargeError",
+    "merge_chunks",
+    "JobJournal",
+    "JournalJob",
+    "LazyTranscriptionItem",
+    "parse_transcription",
+    "TranscriptCache",
+    "TokenEstimator",
+    "ResponseCache",
 ]
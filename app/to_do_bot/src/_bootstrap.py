@@ -2,17 +2,30 @@ import asyncio
 
 from src.llm import GigaChatLLM
 from src.audio_handler import AudioHandler
+from src.downloader import Downloader
+from src.journal import JobJournal
 from src.salute_speech_stt import SaluteSpeechHandler
-from src.static import task_prompt, done_deals, simple_summary
+from src.static import task_prompt, done_deals, simple_summary, chunk_prompt
+from src.vad import VoiceActivityTrimmer
 
 
 def init_bootstrap(
     *args, **kwargs
-) -> tuple[GigaChatLLM, AudioHandler, SaluteSpeechHandler]:
+) -> tuple[
+    GigaChatLLM,
+    AudioHandler,
+    SaluteSpeechHandler,
+    VoiceActivityTrimmer,
+    Downloader,
+    JobJournal,
+]:
+    journal = _init_journal(*args, **kwargs)
     llm = _init_llm_handler(*args, **kwargs)
     audio = _init_audio_handler(*args, **kwargs)
-    speech_stt = _init_speech_stt_handler(*args, **kwargs)
-    return llm, audio, speech_stt
+    speech_stt = _init_speech_stt_handler(*args, journal=journal, **kwargs)
+    vad = _init_vad_handler(*args, **kwargs)
+    downloader = _init_downloader(*args, **kwargs)
+    return llm, audio, speech_stt, vad, downloader, journal
 
 
 def _init_llm_handler(*args, **kwargs) -> GigaChatLLM:
@@ -22,6 +35,7 @@ def _init_llm_handler(*args, **kwargs) -> GigaChatLLM:
             "task_summary": task_prompt,
             "day_summary": done_deals,
             "simple_summary": simple_summary,
+            "chunk_summary": chunk_prompt,
         },
         **kwargs,
     )
@@ -35,10 +49,30 @@ def _init_audio_handler(*args, **kwargs) -> AudioHandler:
     return audio_handler
 
 
-def _init_speech_stt_handler(*args, **kwargs) -> SaluteSpeechHandler:
-    speech_stt_handler = SaluteSpeechHandler(*args, **kwargs)
+def _init_speech_stt_handler(
+    *args, journal: JobJournal, **kwargs
+) -> SaluteSpeechHandler:
+    speech_stt_handler = SaluteSpeechHandler(*args, journal=journal, **kwargs)
 
     loop = asyncio.get_event_loop()
     loop.create_task(speech_stt_handler.start())
 
     return speech_stt_handler
+
+
+def _init_vad_handler(*args, **kwargs) -> VoiceActivityTrimmer:
+    vad = VoiceActivityTrimmer(*args, **kwargs)
+    vad.start()
+    return vad
+
+
+def _init_downloader(*args, **kwargs) -> Downloader:
+    downloader = Downloader(*args, **kwargs)
+    downloader.start()
+    return downloader
+
+
+def _init_journal(*args, **kwargs) -> JobJournal:
+    journal = JobJournal(*args, **kwargs)
+    journal.start()
+    return journal
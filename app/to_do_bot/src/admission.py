@@ -0,0 +1,45 @@
+from typing import Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class AdmissionConfig(BaseSettings):
+    max_duration: float = Field(30 * 60, alias="AUDIO_MAX_DURATION")
+    stt_realtime_factor: float = Field(0.1, alias="STT_REALTIME_FACTOR")
+    eta_overhead: float = Field(15.0, alias="ETA_OVERHEAD")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class AdmissionControl:
+    """
+    Decides whether a chat may queue more audio and how long it will take.
+
+    Works on probed durations; unknown durations are let through since
+    Salute rejects oversized files anyway.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = AdmissionConfig(*args, **kwargs)
+
+    @property
+    def max_duration(self) -> float:
+        return self.config.max_duration
+
+    @staticmethod
+    def total(durations: list[Optional[float]]) -> float:
+        return sum(duration for duration in durations if duration)
+
+    def admit(self, queued: list[Optional[float]], duration: Optional[float]) -> bool:
+        """Check the new file against the limit together with queued ones"""
+        if duration is None:
+            return True
+        return self.total(queued) + duration <= self.max_duration
+
+    def eta(self, durations: list[Optional[float]]) -> float:
+        """Expected seconds from pressing a mode button to the answer"""
+        return (
+            self.total(durations) * self.config.stt_realtime_factor
+            + self.config.eta_overhead
+        )
@@ -1,82 +1,420 @@
 import asyncio
-from io import BytesIO
-from typing import Any
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
 
-import aiohttp
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydub import AudioSegment
 
+from src.buffer import AudioBuffer
+from src.buffer import get_config as get_buffer_config
+from src.downloader import Downloader
 from src.handler import Handler
-from src.schemas import Audio, Audios
+from src.ogg import concat_opus
+from src.pcm import (
+    TARGET_CHANNELS,
+    TARGET_SAMPLE_RATE,
+    normalize_to_wav,
+    wav_header,
+)
+from src.probe import (
+    PROBE_SIZE,
+    ProbeResult,
+    WavParams,
+    detect_format,
+    id3_size,
+    mp3_info_frame,
+    parse_mp3_frame,
+    parse_stream_params,
+    parse_wav_params,
+    probe_duration,
+)
+from src.schemas import Audio, Audios, OffsetMap
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "wav"
+PASSTHROUGH_FORMATS = {"ogg", "mp3", "flac"}
+PASSTHROUGH_WAV = WavParams(
+    channels=TARGET_CHANNELS, sample_rate=TARGET_SAMPLE_RATE, bits_per_sample=16
+)
+
+
+class AudioHandlerConfig(BaseSettings):
+    use_process_pool: bool = Field(True, alias="AUDIO_USE_PROCESS_POOL")
+    workers: int = Field(
+        default_factory=lambda: os.cpu_count() or 1, alias="AUDIO_WORKERS"
+    )
+    queue_size: int = Field(32, alias="AUDIO_QUEUE_SIZE")
+    stream_decode_threshold: int = Field(
+        2 * 1024 * 1024, alias="AUDIO_STREAM_DECODE_THRESHOLD"
+    )
+
+    model_config = SettingsConfigDict(extra="ignore")
 
 
 class AudioHandler(Handler):
     """
     Handler for audio files.
+
+    `handle` does the work inline, `ahandle` sends it to a process pool
+    through a bounded queue so the event loop is never blocked by ffmpeg.
     """
 
+    class Config(AudioHandlerConfig):
+        name: str = Field(default="AudioHandler")
+
     def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
+        super().__init__()
         self._is_running = False
         self.files = []
+        self.config = self.Config(*args, **kwargs)
+        self._executor: ProcessPoolExecutor | None = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
 
     def handle(self, files: Audios, *args: Any, **kwargs: Any) -> Audio:
-        response = None
         if not self._is_running:
             raise RuntimeError("Handler not started")
-        if isinstance(files.files, list):
-            all_files: list[AudioSegment] = self._get_audio_segments(files.files)
-            response = self._join_audio_files(all_files, files.format)
-            return Audio(file=response, format=files.format)
-
-        elif isinstance(files.files, bytes):
-            response = self._get_audio_segment(files.files)
-        else:
-            raise TypeError("Invalid type for files")
-        return Audio(file=response.raw_data, format=files.format)
+        return process_audios(files, self.config.stream_decode_threshold)
 
-    def _get_audio_segment(self, input_file: bytes | BytesIO) -> AudioSegment:
-        """
-        Convert audio file to the specified format.
-        """
-        if isinstance(input_file, bytes):
-            input_file = BytesIO(input_file)
-        audio: AudioSegment = AudioSegment.from_file(input_file)
-        return audio
-
-    def _get_audio_segments(
-        self, input_files: list[bytes | BytesIO]
-    ) -> list[AudioSegment]:
+    async def ahandle(self, files: Audios) -> Audio:
         """
-        Convert a list of audio files to the specified format.
-        """
-        audio_segments = []
-        for input_file in input_files:
-            audio_segment: AudioSegment = self._get_audio_segment(input_file)
-            audio_segments.append(audio_segment)
-        return audio_segments
+        Process audio files off the event loop.
 
-    def _join_audio_files(
-        self, audio_segments: list[AudioSegment], output_format: str
-    ) -> bytes:
+        Waits for a free slot when the queue is full.
         """
-        Join a list of audio segments into a single audio segment.
+        if not self._is_running:
+            raise RuntimeError("Handler not started")
+        # Container-level joins are cheap, keep their payloads out of the pool
+        if _can_passthrough(files):
+            joined = await asyncio.to_thread(join_passthrough, files)
+            if joined is not None:
+                return joined
+        if not self.config.use_process_pool:
+            return await asyncio.to_thread(
+                decode_audios, files, self.config.stream_decode_threshold
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((files, future))
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            files, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                result = await self._run_in_pool(
+                    decode_audios, files, self.config.stream_decode_threshold
+                )
+                if not future.cancelled():
+                    future.set_result(result)
+                else:
+                    # Large results are backed by temp files
+                    result.close()
+            except Exception as e:
+                logger.error(f"Audio processing failed: {e}", exc_info=True)
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _run_in_pool(self, func, *args):
         """
-        combined = AudioSegment.empty()
-        for audio in audio_segments:
-            combined += audio
-        buffer = BytesIO()
-        combined.export(buffer, format=output_format)
+        Run a job in the pool, recreating it once if a worker died.
 
-        return buffer.getvalue()
+        A killed worker, e.g. by the OOM killer, breaks the whole pool.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # Workers failing together restart the pool only once
+            if self._executor is executor:
+                logger.error("Audio process pool is broken, restarting it")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = ProcessPoolExecutor(max_workers=len(self._workers))
+            return await loop.run_in_executor(self._executor, func, *args)
 
     def start(self):
+        if self.config.use_process_pool:
+            workers = max(1, self.config.workers)
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+            self._queue = asyncio.Queue(maxsize=self.config.queue_size)
+            loop = asyncio.get_running_loop()
+            self._workers = [
+                loop.create_task(self._worker(), name=f"audio_worker_{i}")
+                for i in range(workers)
+            ]
+            logger.info(
+                f"Audio process pool started: workers={workers}, "
+                f"queue_size={self.config.queue_size}"
+            )
         self._is_running = True
         return super().start()
 
     def stop(self):
+        self._is_running = False
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
         return super().stop()
 
 
+def process_audios(files: Audios, stream_decode_threshold: int = 0) -> Audio:
+    """
+    Decode, join and export audio files.
+
+    Payloads Salute accepts natively are uploaded as is, everything else
+    is decoded and normalized to 16 kHz mono PCM. Inputs that are spilled
+    to disk or larger than `stream_decode_threshold` are decoded by ffmpeg
+    in a stream, so they never sit in memory as a whole.
+    """
+    if _can_passthrough(files):
+        joined = join_passthrough(files)
+        if joined is not None:
+            return joined
+    return decode_audios(files, stream_decode_threshold)
+
+
+def join_passthrough(files: Audios) -> Optional[Audio]:
+    """
+    Join files Salute accepts natively, None if they need a decode.
+    """
+    logger.info(f"Passthrough of {len(files.files)} {files.format} file(s)")
+    try:
+        return _join_same_codec(files)
+    except ValueError as e:
+        logger.warning(f"Container join failed, decoding instead: {e}")
+        return None
+
+
+def decode_audios(files: Audios, stream_decode_threshold: int = 0) -> Audio:
+    """
+    Decode and join files into 16 kHz mono PCM.
+
+    Module level so it can be pickled into a worker process.
+    """
+    total_size = sum(len(file) for file in files.files)
+    if stream_decode_threshold and (
+        total_size > stream_decode_threshold
+        or any(file.spilled for file in files.files)
+    ):
+        response = decode_to_pcm(files.files)
+    else:
+        all_files: list[AudioSegment] = _get_audio_segments(files.files)
+        response = _join_audio_files(all_files)
+    return Audio(
+        file=response,
+        format=EXPORT_FORMAT,
+        sample_rate=TARGET_SAMPLE_RATE,
+        channels_count=TARGET_CHANNELS,
+        duration=files.duration,
+    )
+
+
+def _can_passthrough(files: Audios) -> bool:
+    """
+    Check whether the files can be sent to STT without a transcode.
+    """
+    if len(files.files) == 1:
+        if files.format == "wav":
+            return parse_wav_params(files.files[0]) == PASSTHROUGH_WAV
+        return files.format in PASSTHROUGH_FORMATS
+    return files.format in CONCATENATORS
+
+
+def _join_same_codec(files: Audios) -> Audio:
+    """
+    Join files without a decode, declaring the parameters they really have.
+    """
+    segments = None
+    if len(files.files) == 1:
+        joined = files.files[0]
+    else:
+        joined = AudioBuffer()
+        try:
+            segments = CONCATENATORS[files.format](files.files, joined)
+        except Exception:
+            joined.close()
+            raise
+    params = parse_stream_params(joined, files.format)
+    if params is None:
+        if joined is not files.files[0]:
+            joined.close()
+        raise ValueError(f"Unreadable {files.format} stream parameters")
+    return Audio(
+        file=joined,
+        format=files.format,
+        sample_rate=params.sample_rate,
+        channels_count=params.channels,
+        offset_map=OffsetMap(segments=segments) if segments else None,
+        duration=files.duration,
+    )
+
+
+def _concat_bytes(input_files: list[AudioBuffer], output: AudioBuffer) -> None:
+    """
+    Chain MPEG frames of files with the same sample rate and channels.
+
+    Frames are self-contained. ID3v2 tags of all but the first file and
+    ID3v1 trailers are dropped so no tag ends up mid-stream. Xing/Info
+    frames are dropped too, their frame and byte counts would describe
+    a single file, not the joined stream.
+    """
+    first = None
+    for index, input_file in enumerate(input_files):
+        view = input_file.view()
+        start = id3_size(view)
+        frame = parse_mp3_frame(view, start)
+        if frame is None:
+            raise ValueError("No MPEG frame after the ID3 tag")
+        if first is None:
+            first = frame
+        elif (frame.sample_rate, frame.channels) != (first.sample_rate, first.channels):
+            raise ValueError("MP3 files have different sample rates or channels")
+        audio_start = start
+        if mp3_info_frame(view, frame):
+            audio_start += frame.size
+        end = len(view)
+        if end - start >= 128 and bytes(view[end - 128 : end - 125]) == b"TAG":
+            end -= 128  # ID3v1 at the end
+        if index == 0:
+            output.write(view[:start])
+        output.write(view[audio_start:end])
+
+
+def _concat_ogg(
+    input_files: list[AudioBuffer], output: AudioBuffer
+) -> list[tuple[float, float, float]]:
+    """
+    Join Ogg/Opus files at the page level without a PCM decode.
+
+    Returns the segments mapping the joined timeline back to the files.
+    """
+    return concat_opus([input_file.view() for input_file in input_files], output)
+
+
+# Same-codec joins that do not need a decode
+CONCATENATORS = {
+    "ogg": _concat_ogg,
+    "mp3": _concat_bytes,
+}
+
+
+def _get_audio_segment(input_file: AudioBuffer) -> AudioSegment:
+    """
+    Convert audio file to the specified format.
+    """
+    if input_file.spilled:
+        return AudioSegment.from_file(input_file.path)
+    with input_file.open() as f:
+        audio: AudioSegment = AudioSegment.from_file(f)
+    return audio
+
+
+def _get_audio_segments(input_files: list[AudioBuffer]) -> list[AudioSegment]:
+    """
+    Convert a list of audio files to the specified format.
+    """
+    audio_segments = []
+    for input_file in input_files:
+        audio_segment: AudioSegment = _get_audio_segment(input_file)
+        audio_segments.append(audio_segment)
+    return audio_segments
+
+
+def _join_audio_files(audio_segments: list[AudioSegment]) -> AudioBuffer:
+    """
+    Join audio segments into a single 16 kHz mono PCM_S16LE WAV file.
+
+    Segments are normalized straight into one preallocated array, so the
+    join is linear in the total length.
+    """
+    wav = normalize_to_wav(audio_segments, TARGET_SAMPLE_RATE)
+    return AudioBuffer.wrap(wav)
+
+
+def decode_to_pcm(input_files: list[AudioBuffer]) -> AudioBuffer:
+    """
+    Decode files with ffmpeg straight to 16 kHz mono s16 WAV, chunk by chunk.
+
+    Works for any container ffmpeg knows, the payload is never held whole.
+
+    The WAV header is written with zero sizes and patched at the end.
+    """
+    output = AudioBuffer()
+    output.write(wav_header(0, TARGET_SAMPLE_RATE, TARGET_CHANNELS))
+    try:
+        for input_file in input_files:
+            _ffmpeg_decode(input_file, output)
+        output.patch(0, wav_header(len(output) - 44, TARGET_SAMPLE_RATE))
+    except Exception:
+        output.close()
+        raise
+    return output
+
+
+def _ffmpeg_decode(input_file: AudioBuffer, output: AudioBuffer) -> None:
+    command = [
+        AudioSegment.converter,
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        input_file.path if input_file.spilled else "pipe:0",
+        "-f",
+        "s16le",
+        "-ac",
+        str(TARGET_CHANNELS),
+        "-ar",
+        str(TARGET_SAMPLE_RATE),
+        "pipe:1",
+    ]
+    with tempfile.TemporaryFile() as stderr:
+        if input_file.spilled:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        else:
+            # Feed stdin from a thread so a full stdout pipe can not deadlock
+            process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr
+            )
+            feeder = threading.Thread(
+                target=_feed_stdin, args=(process.stdin, input_file), daemon=True
+            )
+            feeder.start()
+        while chunk := process.stdout.read(get_buffer_config().chunk_size):
+            output.write(chunk)
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(
+                f"ffmpeg failed: {stderr.read().decode(errors='replace')}"
+            )
+
+
+def _feed_stdin(stdin, input_file: AudioBuffer) -> None:
+    try:
+        for chunk in input_file.iter_chunks():
+            stdin.write(chunk)
+    except BrokenPipeError:
+        pass
+    finally:
+        stdin.close()
+
+
 def create_audio_from_files_paths(files: list[str]) -> Audios:
     """
     Create an Audio object from a list of file paths.
@@ -90,20 +428,61 @@ def create_audio_from_files_paths(files: list[str]) -> Audios:
     return Audios(files=audio_files, format=format_file)
 
 
-async def download_audio_file(session: aiohttp.ClientSession, url: str) -> bytes:
-    async with session.get(url) as response:
-        if response.status != 200:
-            raise ValueError("Failed to fetch audio file")
-        return await response.read()
+@asynccontextmanager
+async def _use_downloader(
+    downloader: Optional[Downloader],
+) -> AsyncIterator[Downloader]:
+    """The shared downloader, or a short-lived one for scripts"""
+    if downloader is not None:
+        yield downloader
+        return
+    downloader = Downloader()
+    downloader.start()
+    try:
+        yield downloader
+    finally:
+        await downloader.stop()
 
 
-async def create_audio_from_links(links: list[str]) -> Audios:
+async def create_audio_from_links(
+    links: list[str],
+    duration: Optional[float] = None,
+    downloader: Optional[Downloader] = None,
+) -> Audios:
     """
     Create an Audio object from a list of file links.
+
+    The format is detected from the downloaded bytes, it is None when the
+    files have different or unknown containers. `duration` is the probed
+    total length, if known.
     """
-    async with aiohttp.ClientSession() as session:
-        tasks = [download_audio_file(session, link) for link in links]
-        audio_files = await asyncio.gather(*tasks)
-        format_file = "mp3"
+    async with _use_downloader(downloader) as downloader:
+        audio_files = await downloader.download_many(links)
 
-    return Audios(files=audio_files, format=format_file)
+    formats = {detect_format(audio_file) for audio_file in audio_files}
+    format_file = formats.pop() if len(formats) == 1 else None
+    logger.info(f"Detected audio format: {format_file}")
+
+    return Audios(files=audio_files, format=format_file, duration=duration)
+
+
+async def probe_audio_link(
+    url: str,
+    probe_size: int = PROBE_SIZE,
+    downloader: Optional[Downloader] = None,
+) -> ProbeResult:
+    """
+    Probe format and duration reading only the head and tail of a file.
+    """
+    async with _use_downloader(downloader) as downloader:
+        head, size, partial = await downloader.read_range(
+            url, f"bytes=0-{probe_size - 1}", probe_size
+        )
+        tail = b""
+        if partial and size and size > probe_size:
+            tail, _, _ = await downloader.read_range(
+                url, f"bytes=-{probe_size}", probe_size
+            )
+        elif size is not None and size <= len(head):
+            tail = head
+    return probe_duration(head, tail, size)
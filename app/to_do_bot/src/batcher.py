@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from src.audio_handler import PASSTHROUGH_WAV, decode_to_pcm
+from src.buffer import AudioBuffer
+from src.pcm import TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH, wav_header
+from src.probe import find_wav_data, parse_wav_params
+from src.schemas import Audio, LazyTranscriptionItem
+
+logger = logging.getLogger(__name__)
+
+Recognize = Callable[[Audio], Awaitable[Optional[list[LazyTranscriptionItem]]]]
+
+
+class ChannelBatcherConfig(BaseSettings):
+    enabled: bool = Field(False, alias="STT_BATCH_ENABLED")
+    max_channels: int = Field(4, alias="STT_BATCH_MAX_CHANNELS")
+    window: float = Field(0.5, alias="STT_BATCH_WINDOW")
+    max_duration: float = Field(60.0, alias="STT_BATCH_MAX_DURATION")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+@dataclass
+class _Pending:
+    audio: Audio
+    future: asyncio.Future
+
+
+class ChannelBatcher:
+    """
+    Packs short recordings of concurrent jobs into one multi-channel task.
+
+    Recordings submitted within `window` of the first one are laid out as
+    channels of one 16 kHz s16 WAV, up to `max_channels`, and recognized
+    with a single upload, recognize call and poll. Results are split back
+    by their `channel`. If the packed task fails, every recording is
+    recognized on its own.
+    """
+
+    def __init__(self, recognize: Recognize, *args, **kwargs) -> None:
+        self.config = ChannelBatcherConfig(*args, **kwargs)
+        self._recognize = recognize
+        self._pending: list[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched = 0
+
+    def accepts(self, audio: Audio) -> bool:
+        return (
+            self.config.enabled
+            and self.config.max_channels > 1
+            and audio.channels_count == 1
+            and audio.duration is not None
+            and audio.duration <= self.config.max_duration
+        )
+
+    async def submit(self, audio: Audio) -> Optional[list[LazyTranscriptionItem]]:
+        """Recognize a short mono recording as part of the next batch"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Pending(audio, future))
+        if len(self._pending) >= self.config.max_channels:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.config.window, self._flush
+            )
+        return await future
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for pending in self._pending:
+            pending.future.cancel()
+        self._pending.clear()
+        for batch in self._batches:
+            batch.cancel()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Callers cancelled while waiting for the window are dropped
+        batch = [pending for pending in self._pending if not pending.future.done()]
+        self._pending.clear()
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: list[_Pending]) -> None:
+        try:
+            if len(batch) == 1:
+                _resolve(batch[0], await self._recognize(batch[0].audio))
+                return
+            try:
+                results = await self._recognize_packed([p.audio for p in batch])
+            except Exception as e:
+                logger.error(f"Packing a batch of {len(batch)} recordings failed: {e}")
+                results = None
+            if results is None:
+                logger.warning(
+                    f"Batch of {len(batch)} recordings failed, "
+                    "recognizing them one by one"
+                )
+                # One bad recording must not fail the others
+                results = await asyncio.gather(
+                    *(self._recognize(pending.audio) for pending in batch),
+                    return_exceptions=True,
+                )
+            for pending, result in zip(batch, results):
+                _resolve(pending, result)
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+
+    async def _recognize_packed(
+        self, audios: list[Audio]
+    ) -> Optional[list[Optional[list[LazyTranscriptionItem]]]]:
+        packed = await asyncio.to_thread(pack_channels, audios)
+        try:
+            items = await self._recognize(packed)
+        finally:
+            packed.close()
+        if items is None:
+            return None
+        self.batches += 1
+        self.batched += len(audios)
+        logger.info(f"Recognized {len(audios)} recordings as one task")
+        return [
+            [item for item in items if item.channel == channel]
+            for channel in range(len(audios))
+        ]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "batches": self.batches,
+            "batched": self.batched,
+            "pending": len(self._pending),
+        }
+
+
+def _resolve(
+    pending: _Pending,
+    result: Optional[list[LazyTranscriptionItem]] | BaseException,
+) -> None:
+    if pending.future.done():
+        return
+    if isinstance(result, BaseException):
+        pending.future.set_exception(result)
+    else:
+        pending.future.set_result(result)
+
+
+def pack_channels(audios: list[Audio]) -> Audio:
+    """
+    Lay recordings out as channels of one 16 kHz s16 WAV.
+
+    Compressed input is decoded first; shorter recordings are padded with
+    silence so every channel starts at zero.
+    """
+    decoded: list[Optional[AudioBuffer]] = []
+    channels: list[np.ndarray] = []
+    try:
+        for audio in audios:
+            buffer = None
+            if parse_wav_params(audio.file) != PASSTHROUGH_WAV:
+                buffer = decode_to_pcm([audio.file])
+            decoded.append(buffer)
+            channels.append(_samples(buffer if buffer is not None else audio.file))
+
+        length = max(len(samples) for samples in channels)
+        frames = np.zeros((length, len(channels)), dtype="<i2")
+        for index, samples in enumerate(channels):
+            frames[: len(samples), index] = samples
+    finally:
+        # Sample views must be gone before their buffers are closed
+        channels.clear()
+        for buffer in decoded:
+            if buffer is not None:
+                buffer.close()
+
+    output = AudioBuffer()
+    output.write(wav_header(frames.nbytes, TARGET_SAMPLE_RATE, len(audios)))
+    output.write(frames)
+    return Audio(
+        file=output,
+        format="wav",
+        sample_rate=TARGET_SAMPLE_RATE,
+        channels_count=len(audios),
+        duration=length / TARGET_SAMPLE_RATE,
+    )
+
+
+def _samples(wav: AudioBuffer) -> np.ndarray:
+    location = find_wav_data(wav)
+    if location is None:
+        raise ValueError("Not a WAV file")
+    offset, size = location
+    size -= size % TARGET_SAMPLE_WIDTH
+    return np.frombuffer(wav.view()[offset : offset + size], dtype="<i2")
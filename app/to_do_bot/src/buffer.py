@@ -0,0 +1,289 @@
+import io
+import logging
+import mmap
+import os
+import pickle
+import tempfile
+from collections.abc import Buffer
+from typing import BinaryIO, Iterator, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+
+class AudioBufferConfig(BaseSettings):
+    spill_threshold: int = Field(8 * 1024 * 1024, alias="AUDIO_SPILL_THRESHOLD")
+    spill_dir: Optional[str] = Field(None, alias="AUDIO_SPILL_DIR")
+    chunk_size: int = Field(256 * 1024, alias="AUDIO_CHUNK_SIZE")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+_config: Optional[AudioBufferConfig] = None
+
+
+def get_config() -> AudioBufferConfig:
+    global _config
+    if _config is None:
+        _config = AudioBufferConfig()
+    return _config
+
+
+class AudioBuffer:
+    """
+    Append-only byte buffer for audio payloads.
+
+    Data is kept in memory until it grows past `spill_threshold`, then it is
+    moved to a temp file and read back through `mmap`, so the resident size
+    of a job does not depend on the recording length.
+
+    `wrap` adopts an existing bytes-like object without copying it, such a
+    buffer is read-only. The buffer is pickled by path once spilled, which
+    lets a worker process read its input and hand its output back without
+    copying the payload.
+    The temp file is removed by `close()` only, whoever closes the buffer
+    owns it.
+    """
+
+    def __init__(
+        self,
+        spill_threshold: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        config = get_config()
+        self.spill_threshold = (
+            config.spill_threshold if spill_threshold is None else spill_threshold
+        )
+        self.spill_dir = config.spill_dir if spill_dir is None else spill_dir
+        self._memory: Optional[bytearray | memoryview] = bytearray()
+        self._file: Optional[BinaryIO] = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._closed = False
+
+    @classmethod
+    def from_bytes(
+        cls, data: bytes | bytearray | memoryview, **kwargs
+    ) -> "AudioBuffer":
+        buffer = cls(**kwargs)
+        buffer.write(data)
+        return buffer
+
+    @classmethod
+    def wrap(cls, data: Buffer, **kwargs) -> "AudioBuffer":
+        """Zero-copy, read-only buffer over any C-contiguous buffer object"""
+        buffer = cls(**kwargs)
+        buffer._memory = _as_bytes_view(data).toreadonly()
+        buffer._size = buffer._memory.nbytes
+        return buffer
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def spilled(self) -> bool:
+        return self._path is not None
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path of the backing file, None while the data is in memory"""
+        if self._file:
+            self._file.flush()
+        return self._path
+
+    def write(self, data: Buffer) -> int:
+        if self._closed:
+            raise ValueError("Buffer is closed")
+        if self._mmap is not None or isinstance(self._memory, memoryview):
+            raise ValueError("Buffer is read-only")
+        data = _as_bytes_view(data)
+        if self._memory is not None:
+            if len(self._memory) + len(data) <= self.spill_threshold:
+                self._memory += data
+                self._size += len(data)
+                return len(data)
+            self._spill()
+        if self._file is None:
+            self._file = open(self._path, "ab")
+        self._file.write(data)
+        self._size += len(data)
+        return len(data)
+
+    def patch(self, offset: int, data: bytes) -> None:
+        """Overwrite already written bytes, e.g. a header with sizes"""
+        if self._mmap is not None or isinstance(self._memory, memoryview):
+            raise ValueError("Buffer is read-only")
+        if offset + len(data) > self._size:
+            raise ValueError("Patch is out of bounds")
+        if self._memory is not None:
+            self._memory[offset : offset + len(data)] = data
+            return
+        if self._file:
+            self._file.flush()
+        with open(self._path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def _spill(self) -> None:
+        fd, self._path = tempfile.mkstemp(
+            prefix="audio_", suffix=".bin", dir=self.spill_dir
+        )
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._memory)
+        self._memory = None
+        logger.info(f"Audio buffer spilled to {self._path} at {self._size} bytes")
+
+    def view(self) -> memoryview:
+        """
+        Read-only view of the whole payload, memory-mapped when spilled.
+        """
+        if self._closed:
+            raise ValueError("Buffer is closed")
+        if self._memory is not None:
+            return memoryview(self._memory)
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._size == 0:
+            return memoryview(b"")
+        if self._mmap is None:
+            with open(self._path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def head(self, size: int) -> bytes:
+        """First `size` bytes, without mapping or finishing the buffer"""
+        if self._closed:
+            raise ValueError("Buffer is closed")
+        if self._memory is not None:
+            return bytes(self._memory[:size])
+        if self._mmap is not None:
+            return self._mmap[:size]
+        if self._file:
+            self._file.flush()
+        if self._path is None:
+            return b""
+        with open(self._path, "rb") as f:
+            return f.read(size)
+
+    def open(self) -> BinaryIO:
+        """File object over the payload, streams from disk when spilled"""
+        if self._memory is not None:
+            return io.BufferedReader(_MemoryReader(self.view()))
+        if self._file:
+            self._file.flush()
+        return open(self._path, "rb")
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[memoryview]:
+        chunk_size = chunk_size or get_config().chunk_size
+        view = self.view()
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset : offset + chunk_size]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._memory = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still exported, the mapping is freed with it
+                logger.debug("Audio buffer mmap still in use")
+            self._mmap = None
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._path:
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __reduce_ex__(self, protocol):
+        if self._file:
+            self._file.flush()
+        state = {
+            "spill_threshold": self.spill_threshold,
+            "spill_dir": self.spill_dir,
+            "size": self._size,
+            "path": self._path,
+            "data": None,
+        }
+        if self._path is None:
+            # Protocol 5 skips the intermediate bytes object; the payload is
+            # still copied into the pickle unless pickled out-of-band, as
+            # ProcessPoolExecutor does not. Spill large payloads instead.
+            state["data"] = (
+                pickle.PickleBuffer(self._memory)
+                if protocol >= 5
+                else bytes(self._memory)
+            )
+        return _restore, (state,)
+
+    def __repr__(self) -> str:
+        where = f"path={self._path}" if self._path else "memory"
+        return f"AudioBuffer(length={self._size}, {where})"
+
+
+def _restore(state: dict) -> AudioBuffer:
+    buffer = AudioBuffer.__new__(AudioBuffer)
+    buffer.spill_threshold = state["spill_threshold"]
+    buffer.spill_dir = state["spill_dir"]
+    buffer._size = state["size"]
+    buffer._path = state["path"]
+    buffer._memory = None
+    if buffer._path is None:
+        buffer._memory = _as_bytes_view(state["data"]).toreadonly()
+    buffer._file = None
+    buffer._mmap = None
+    buffer._closed = False
+    return buffer
+
+
+def _as_bytes_view(data: Buffer) -> memoryview:
+    """Flat unsigned-byte view, `len` of which is the size in bytes"""
+    view = memoryview(data)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+
+class _MemoryReader(io.RawIOBase):
+    """Seekable raw reader over a memoryview, reads copy only what is asked"""
+
+    def __init__(self, view: memoryview) -> None:
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._position : self._position + len(b)]
+        b[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
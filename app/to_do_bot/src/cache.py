@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from src.buffer import AudioBuffer
+from src.schemas import LazyTranscriptionItem
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    cost REAL NOT NULL DEFAULT 0,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class LRUCache:
+    """
+    In-memory LRU cache with a TTL and an optional SQLite copy on disk.
+
+    Values must be JSON-serializable, they are stored as is in memory and
+    as JSON on disk. Entries evicted from memory are still found on disk
+    until they expire. Each entry carries a `cost`, the work a hit saves,
+    summed up in `saved`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl: float,
+        path: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: OrderedDict[str, tuple[Any, float, float]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0.0
+
+    def start(self) -> None:
+        if self.path:
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+            self._db.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+            logger.info(f"{self.name} cache opened at {self.path}")
+
+    def stop(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __contains__(self, key: str) -> bool:
+        """Lookup that does not count as a hit or a miss"""
+        return self._lookup(key) is not None
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, cost, _ = entry
+        self.hits += 1
+        self.saved += cost
+        return value
+
+    def put(self, key: str, value: Any, cost: float = 0.0) -> None:
+        expires_at = time.time() + self.ttl
+        self._remember(key, (value, cost, expires_at))
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, cost, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), cost, expires_at),
+            )
+
+    def _lookup(self, key: str) -> Optional[tuple[Any, float, float]]:
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT value, cost, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = (json.loads(row[0]), row[1], row[2])
+                self._remember(key, entry)
+        if entry is None:
+            return None
+        if entry[2] < time.time():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remember(self, key: str, entry: tuple[Any, float, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved": self.saved,
+        }
+
+
+class TranscriptCacheConfig(BaseSettings):
+    max_entries: int = Field(1000, alias="TRANSCRIPT_CACHE_SIZE")
+    ttl: float = Field(7 * 24 * 60 * 60, alias="TRANSCRIPT_CACHE_TTL")
+    path: Optional[str] = Field(None, alias="TRANSCRIPT_CACHE_PATH")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class TranscriptCache(LRUCache):
+    """
+    Transcripts by Telegram `file_unique_id` or by audio content hash.
+
+    The cost of an entry is the duration of the recording, so `saved` is
+    the seconds of STT not paid for again.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = TranscriptCacheConfig(*args, **kwargs)
+        super().__init__(
+            "Transcript", self.config.max_entries, self.config.ttl, self.config.path
+        )
+
+    @staticmethod
+    def file_key(file_unique_id: str) -> str:
+        return f"file:{file_unique_id}"
+
+    @staticmethod
+    def content_key(audio: AudioBuffer) -> str:
+        """Key of a recording by its bytes, for merged or re-uploaded files"""
+        digest = hashlib.sha256()
+        for chunk in audio.iter_chunks(1024 * 1024):
+            digest.update(chunk)
+        return f"audio:{digest.hexdigest()}"
+
+    def get_transcript(self, key: str) -> Optional[list[LazyTranscriptionItem]]:
+        raw = self.get(key)
+        if raw is None:
+            return None
+        return [LazyTranscriptionItem(item) for item in raw]
+
+    def put_transcript(
+        self,
+        key: str,
+        items: list[LazyTranscriptionItem],
+        duration: Optional[float],
+    ) -> None:
+        self.put(key, [item.dump() for item in items], duration or 0.0)
+
+    def stats(self) -> dict[str, float]:
+        stats = super().stats()
+        stats["stt_seconds_saved"] = stats.pop("saved")
+        return stats
+
+
+class ResponseCacheConfig(BaseSettings):
+    enabled: bool = Field(True, alias="LLM_CACHE_ENABLED")
+    max_entries: int = Field(500, alias="LLM_CACHE_SIZE")
+    ttl: float = Field(24 * 60 * 60, alias="LLM_CACHE_TTL")
+    path: Optional[str] = Field(None, alias="LLM_CACHE_PATH")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class ResponseCache(LRUCache):
+    """
+    LLM responses by a hash of everything that shapes them.
+
+    The cost of an entry is the tokens the request was billed for, so
+    `saved` is the tokens not paid for again.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = ResponseCacheConfig(*args, **kwargs)
+        super().__init__(
+            "LLM response", self.config.max_entries, self.config.ttl, self.config.path
+        )
+
+    @staticmethod
+    def key(
+        topic: str, system_prompt: str, message: str, model: str, temperature: float
+    ) -> str:
+        payload = json.dumps(
+            [topic, system_prompt, message, model, temperature], ensure_ascii=False
+        )
+        return f"llm:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def stats(self) -> dict[str, float]:
+        stats = super().stats()
+        stats["tokens_saved"] = stats.pop("saved")
+        return stats
@@ -67,7 +67,9 @@ class BaseHTTPClient(AbstractClient):
         method: HTTPMethods,
         url: str,
         headers: Optional[dict] = None,
-        data: Optional[Union[str, bytes, dict, aiohttp.FormData]] = None,
+        data: Optional[
+            Union[str, bytes, dict, aiohttp.FormData, aiohttp.MultipartWriter]
+        ] = None,
         json: Optional[dict] = None,
     ):
         output = None
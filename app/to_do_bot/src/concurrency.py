@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+import aiohttp
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiterConfig(BaseSettings):
+    min_limit: int = Field(1, alias="CONCURRENCY_MIN_LIMIT")
+    max_limit: int = Field(32, alias="CONCURRENCY_MAX_LIMIT")
+    backoff_ratio: float = Field(0.5, alias="CONCURRENCY_BACKOFF_RATIO")
+    latency_tolerance: float = Field(2.0, alias="CONCURRENCY_LATENCY_TOLERANCE")
+    smoothing: float = Field(0.2, alias="CONCURRENCY_SMOOTHING")
+    baseline_drift: float = Field(0.01, alias="CONCURRENCY_BASELINE_DRIFT")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+def is_overload(error: BaseException) -> bool:
+    """The service is shedding load: 429, 5xx or a timeout"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, TimeoutError)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit of one endpoint adjusted AIMD-style.
+
+    While requests use the whole limit and succeed, it grows by about one
+    per `limit` successes. A 429, 5xx or timeout, or a smoothed latency
+    above `latency_tolerance` times the best one seen, multiplies it by
+    `backoff_ratio`, at most once per round trip. Endpoints whose latency
+    depends on the payload size are created with `latency_sensitive` off
+    and react to errors only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        *args,
+        latency_sensitive: bool = True,
+        classify: Callable[[BaseException], bool] = is_overload,
+        **kwargs,
+    ) -> None:
+        self.config = AdaptiveLimiterConfig(*args, **kwargs)
+        self.name = name
+        self.latency_sensitive = latency_sensitive
+        self.classify = classify
+        self._limit = float(self._clamp(initial_limit))
+        self.inflight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._latency: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._decreased_at = 0.0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _clamp(self, limit: float) -> float:
+        return min(max(limit, self.config.min_limit), self.config.max_limit)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        await self._acquire()
+        saturated = self.inflight >= self.limit
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._release()
+            if self.classify(e):
+                self._decrease(f"{e!r}")
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self._release()
+        self._on_success(time.monotonic() - started, saturated)
+
+    async def _acquire(self) -> None:
+        while self.inflight >= self.limit:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                else:
+                    # Pass the wakeup on to the next waiter
+                    self._wake()
+                raise
+        self.inflight += 1
+
+    def _release(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.inflight
+        while free > 0 and self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                free -= 1
+
+    def _on_success(self, latency: float, saturated: bool) -> None:
+        alpha = self.config.smoothing
+        if self._latency is None:
+            self._latency = self._baseline = latency
+        else:
+            self._latency += alpha * (latency - self._latency)
+            # The baseline creeps up so a lasting change of the service
+            # is eventually accepted as normal
+            drifted = self._baseline * (1 + self.config.baseline_drift)
+            self._baseline = min(latency, drifted)
+        if (
+            self.latency_sensitive
+            and self._latency > self.config.latency_tolerance * self._baseline
+        ):
+            self._decrease(f"latency {self._latency:.2f}s")
+        elif saturated:
+            self._limit = self._clamp(self._limit + 1 / self._limit)
+            self._wake()
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        # Responses to requests sent under the old limit are still arriving
+        if now - self._decreased_at < (self._latency or 1.0):
+            return
+        self._decreased_at = now
+        previous = self.limit
+        self._limit = self._clamp(self._limit * self.config.backoff_ratio)
+        self.decreases += 1
+        logger.info(f"Limit of {self.name} {previous} -> {self.limit}: {reason}")
+
+    def stats(self) -> dict[str, Optional[float]]:
+        return {
+            "limit": self.limit,
+            "inflight": self.inflight,
+            "waiting": len(self._waiters),
+            "latency": self._latency,
+            "decreases": self.decreases,
+        }
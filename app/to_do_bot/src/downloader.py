@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import aiohttp
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from src.buffer import AudioBuffer
+from src.buffer import get_config as get_buffer_config
+from src.handler import Handler
+from src.retry import RetryPolicy, retrying
+
+logger = logging.getLogger(__name__)
+
+
+class DownloaderConfig(BaseSettings):
+    pool_size: int = Field(32, alias="DOWNLOAD_POOL_SIZE")
+    pool_size_per_host: int = Field(16, alias="DOWNLOAD_POOL_SIZE_PER_HOST")
+    keepalive_timeout: float = Field(60.0, alias="DOWNLOAD_KEEPALIVE_TIMEOUT")
+    concurrency: int = Field(16, alias="DOWNLOAD_CONCURRENCY")
+    job_concurrency: int = Field(4, alias="DOWNLOAD_JOB_CONCURRENCY")
+    max_size: int = Field(200 * 1024 * 1024, alias="DOWNLOAD_MAX_SIZE")
+    timeout: float = Field(300.0, alias="DOWNLOAD_TIMEOUT")
+    connect_timeout: float = Field(10.0, alias="DOWNLOAD_CONNECT_TIMEOUT")
+    read_timeout: float = Field(30.0, alias="DOWNLOAD_READ_TIMEOUT")
+    chunk_size: Optional[int] = Field(None, alias="DOWNLOAD_CHUNK_SIZE")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class DownloadTooLargeError(ValueError):
+    """The file is larger than `DOWNLOAD_MAX_SIZE`"""
+
+
+class Downloader(Handler):
+    """
+    Long-lived HTTP downloader for Telegram files.
+
+    One pooled session is shared by all jobs, so connections and TLS
+    sessions are reused. Downloads are limited globally by `concurrency`
+    and within one `download_many` call by `job_concurrency`; bodies are
+    streamed in chunks into an `AudioBuffer`, which spills to disk when
+    large, and cut off at `max_size`.
+    """
+
+    class Config(DownloaderConfig):
+        name: str = Field(default="Downloader")
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = self.Config(*args, **kwargs)
+        self._is_running = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(self.config.concurrency)
+        self.retry = RetryPolicy("telegram", *args, **kwargs)
+        self.active = 0
+        self.downloads = 0
+        self.bytes_downloaded = 0
+
+    def start(self) -> None:
+        connector = aiohttp.TCPConnector(
+            limit=self.config.pool_size,
+            limit_per_host=self.config.pool_size_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+            enable_cleanup_closed=True,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=self.config.timeout,
+                connect=self.config.connect_timeout,
+                sock_read=self.config.read_timeout,
+            ),
+        )
+        self._is_running = True
+        logger.info(
+            f"Downloader started: pool_size={self.config.pool_size}, "
+            f"concurrency={self.config.concurrency}"
+        )
+
+    async def stop(self) -> None:
+        self._is_running = False
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def handle(self, url: str, *args: Any, **kwargs: Any) -> AudioBuffer:
+        return await self.download(url)
+
+    @asynccontextmanager
+    async def _request(
+        self, url: str, headers: Optional[dict[str, str]] = None
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        if not self._is_running:
+            raise RuntimeError("Handler not started")
+        async with self._semaphore:
+            self.active += 1
+            try:
+                async with self._session.get(url, headers=headers) as response:
+                    yield response
+            finally:
+                self.active -= 1
+
+    @retrying("download")
+    async def download(self, url: str) -> AudioBuffer:
+        """
+        Stream a file into an AudioBuffer, spilling to disk if it is large.
+        """
+        max_size = self.config.max_size
+        chunk_size = self.config.chunk_size or get_buffer_config().chunk_size
+        buffer = AudioBuffer()
+        try:
+            async with self._request(url) as response:
+                # Errors are raised as ClientResponseError for the retry policy
+                response.raise_for_status()
+                if response.status != 200:
+                    raise ValueError("Failed to fetch audio file")
+                if response.content_length and response.content_length > max_size:
+                    raise DownloadTooLargeError(
+                        f"Audio file is too large: {response.content_length} bytes"
+                    )
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    if len(buffer) + len(chunk) > max_size:
+                        raise DownloadTooLargeError(
+                            f"Audio file is larger than {max_size} bytes"
+                        )
+                    buffer.write(chunk)
+        except BaseException:
+            buffer.close()
+            raise
+        self.downloads += 1
+        self.bytes_downloaded += len(buffer)
+        return buffer
+
+    async def download_many(self, urls: list[str]) -> list[AudioBuffer]:
+        """
+        Download files of one job keeping their order.
+
+        If any download fails the others are cancelled and their buffers
+        closed.
+        """
+        semaphore = asyncio.Semaphore(self.config.job_concurrency)
+
+        async def download(url: str) -> AudioBuffer:
+            async with semaphore:
+                return await self.download(url)
+
+        tasks = [asyncio.ensure_future(download(url)) for url in urls]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for result in results:
+                if isinstance(result, AudioBuffer):
+                    result.close()
+            raise
+
+    @retrying("probe")
+    async def read_range(
+        self, url: str, range_header: str, limit: int
+    ) -> tuple[bytes, Optional[int], bool]:
+        """
+        Read at most `limit` bytes of a Range request.
+
+        Returns the bytes, the full file size if the server reported it and
+        whether the server honoured the range.
+        """
+        async with self._request(url, headers={"Range": range_header}) as response:
+            response.raise_for_status()
+            if response.status not in (200, 206):
+                raise ValueError(f"Failed to probe audio file: {response.status}")
+            partial = response.status == 206
+            size = response.content_length
+            if partial:
+                content_range = response.headers.get("Content-Range", "")
+                total = content_range.rpartition("/")[2]
+                size = int(total) if total.isdigit() else None
+            data = bytearray()
+            while len(data) < limit:
+                chunk = await response.content.read(limit - len(data))
+                if not chunk:
+                    break
+                data += chunk
+        return bytes(data), size, partial
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "active": self.active,
+            "downloads": self.downloads,
+            "bytes_downloaded": self.bytes_downloaded,
+        }
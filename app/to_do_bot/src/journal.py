@@ -0,0 +1,196 @@
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Optional
+
+from pydantic import BaseModel, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from src.schemas import OffsetMap
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    mode TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    chunks INTEGER,
+    offset_map TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    chunk_offset REAL NOT NULL DEFAULT 0,
+    duration REAL,
+    upload_id TEXT,
+    codec TEXT,
+    sample_rate INTEGER,
+    channels_count INTEGER,
+    task_id TEXT,
+    account TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+class JobJournalConfig(BaseSettings):
+    path: str = Field("stt_journal.sqlite3", alias="JOURNAL_PATH")
+    max_age: float = Field(24 * 60 * 60, alias="JOURNAL_MAX_AGE")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class JournalTask(BaseModel):
+    index: int
+    offset: float = 0.0
+    duration: Optional[float] = None
+    upload_id: Optional[str] = None
+    codec: Optional[str] = None
+    sample_rate: int = 16000
+    channels_count: int = 1
+    task_id: Optional[str] = None
+    account: Optional[str] = None
+
+
+class JournalJob(BaseModel):
+    id: str
+    chat_id: int
+    mode: Optional[str] = None
+    chunks: Optional[int] = None
+    offset_map: Optional[OffsetMap] = None
+    tasks: list[JournalTask] = []
+
+    @property
+    def complete(self) -> bool:
+        """Every chunk was at least uploaded, so the job can be resumed"""
+        return (
+            self.chunks is not None
+            and len(self.tasks) == self.chunks
+            and all(task.upload_id for task in self.tasks)
+        )
+
+
+class JobJournal:
+    """
+    SQLite journal of STT jobs that survives restarts.
+
+    A job is recorded when the user picks a mode, its chunks as they are
+    uploaded and submitted to recognition. Jobs still `running` on
+    startup are resumed from their task or upload ids.
+    Writes are single small transactions in WAL mode.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = JobJournalConfig(*args, **kwargs)
+        self._db: Optional[sqlite3.Connection] = None
+
+    def start(self) -> None:
+        self._db = sqlite3.connect(self.config.path, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self.prune()
+        logger.info(f"Job journal opened at {self.config.path}")
+
+    def stop(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def create_job(self, chat_id: int, mode: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._db.execute(
+            "INSERT INTO jobs (id, chat_id, mode, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_id, chat_id, mode, now, now),
+        )
+        return job_id
+
+    def set_chunks(self, job_id: str, chunks: int) -> None:
+        self._update_job(job_id, chunks=chunks)
+
+    def set_offset_map(self, job_id: str, offset_map: Optional[OffsetMap]) -> None:
+        value = offset_map.model_dump_json() if offset_map else None
+        self._update_job(job_id, offset_map=value)
+
+    def finish_job(self, job_id: str, status: str = "done") -> None:
+        self._update_job(job_id, status=status)
+
+    def record_upload(
+        self,
+        job_id: str,
+        index: int,
+        offset: float,
+        upload_id: str,
+        codec: str,
+        sample_rate: int,
+        channels_count: int,
+        duration: Optional[float],
+        account: Optional[str] = None,
+    ) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO tasks (job_id, idx, chunk_offset, duration, "
+            "upload_id, codec, sample_rate, channels_count, account) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                index,
+                offset,
+                duration,
+                upload_id,
+                codec,
+                sample_rate,
+                channels_count,
+                account,
+            ),
+        )
+
+    def record_task(self, job_id: str, index: int, task_id: str) -> None:
+        self._db.execute(
+            "UPDATE tasks SET task_id = ? WHERE job_id = ? AND idx = ?",
+            (task_id, job_id, index),
+        )
+
+    def pending_jobs(self) -> list[JournalJob]:
+        """Jobs interrupted by a restart, oldest first"""
+        jobs = []
+        rows = self._db.execute(
+            "SELECT id, chat_id, mode, chunks, offset_map FROM jobs "
+            "WHERE status = 'running' ORDER BY created_at"
+        ).fetchall()
+        for row in rows:
+            tasks = self._db.execute(
+                'SELECT idx AS "index", chunk_offset AS "offset", duration, '
+                "upload_id, codec, sample_rate, channels_count, task_id, account "
+                "FROM tasks WHERE job_id = ? ORDER BY idx",
+                (row["id"],),
+            )
+            job = dict(row)
+            if job["offset_map"]:
+                job["offset_map"] = OffsetMap.model_validate_json(job["offset_map"])
+            jobs.append(
+                JournalJob(**job, tasks=[JournalTask(**dict(task)) for task in tasks])
+            )
+        return jobs
+
+    def prune(self) -> None:
+        """Forget finished jobs and jobs too old to be worth resuming"""
+        self._db.execute(
+            "DELETE FROM jobs WHERE status != 'running' OR created_at < ?",
+            (time.time() - self.config.max_age,),
+        )
+
+    def _update_job(self, job_id: str, **values) -> None:
+        columns = ", ".join(f"{column} = ?" for column in values)
+        self._db.execute(
+            f"UPDATE jobs SET {columns}, updated_at = ? WHERE id = ?",
+            (*values.values(), time.time(), job_id),
+        )
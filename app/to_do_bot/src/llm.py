@@ -1,6 +1,8 @@
 import asyncio
+import functools
 import logging
 from gigachat import GigaChat as CoreGigaChat
+from gigachat.exceptions import ResponseError
 import yaml  # type: ignore
 import ssl
 
@@ -8,12 +10,15 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 import certifi
 import pydantic
 from langchain_gigachat import GigaChat
-from langchain_core.messages import BaseMessage
-import backoff
+from langchain_core.messages import AIMessage, BaseMessage
 import httpx
 import httpcore
 
+from src.cache import ResponseCache
 from src.handler import Handler
+from src.retry import RetryPolicy, is_retryable_status, retrying
+from src.token_estimator import TokenEstimator
+from src.token_manager import TokenManager
 
 
 class GigaChatLLMConfig(BaseSettings):
@@ -29,6 +34,9 @@ class GigaChatLLMConfig(BaseSettings):
     simultaneous_requests: int = pydantic.Field(
         1, alias="GIGACHAT_SIMULTANEOUS_REQUESTS"
     )
+    # Longer transcripts are summarized by chunks, 0 disables chunking
+    chunk_tokens: int = pydantic.Field(6000, alias="GIGACHAT_CHUNK_TOKENS")
+    chunk_topic: str = pydantic.Field("chunk_summary", alias="GIGACHAT_CHUNK_TOPIC")
 
     model_config = SettingsConfigDict(extra="ignore")
 
@@ -53,6 +61,14 @@ class GigaChatLLM(Handler):
         self.llm = None
         self.config = self.Config(*args, **kwargs)
         self.logger = logging.getLogger(__name__)
+        self.retry = RetryPolicy("gigachat", *args, classify=is_retryable, **kwargs)
+        self.tokens = TokenManager(
+            self._fetch_access_token, "gigachat", *args, **kwargs
+        )
+        self.estimator = TokenEstimator(*args, **kwargs)
+        self.cache = ResponseCache(*args, **kwargs)
+        # Identical requests in flight share one call
+        self._inflight: dict[str, asyncio.Task] = {}
 
     @property
     def client(self) -> CoreGigaChat:
@@ -68,27 +84,64 @@ class GigaChatLLM(Handler):
         self.logger.info(f"LLM initialized with model: {self.llm.model}")
         self.logger.info(f"Simultaneous requests: {self.config.simultaneous_requests}")
         self.semaphore = asyncio.Semaphore(self.config.simultaneous_requests)
+        # The SDK refreshes lazily on a request, keep its token warm instead
+        self.tokens.start()
+        self.cache.start()
         self.logger.info("LLM started")
 
-    @backoff.on_exception(
-        backoff.expo,
-        (TimeoutError, httpcore.ConnectTimeout, httpx.ConnectTimeout),
-        max_tries=5,
-        max_time=30,
-        jitter=backoff.full_jitter,
-    )
-    async def handle(self, topic: str, message: str) -> BaseMessage:
+    async def _fetch_access_token(self) -> tuple[str, float]:
+        """Refresh the token held by the SDK client"""
+        token = await self.client.aget_token()
+        return token.access_token, token.expires_at / 1000
+
+    def system_prompt(self, topic: str) -> str:
         if topic not in self.system_prompts:
             self.logger.error(f"The topic {topic} has not been found")
             raise ValueError(
                 f"Unknown topic: {topic}. Available topics: {list(self.system_prompts.keys())}"
             )
+        return self.system_prompts[topic]
+
+    async def handle(
+        self, topic: str, message: str, use_cache: bool = True
+    ) -> BaseMessage:
+        """
+        Process a message with the system prompt of a topic.
+
+        Responses are cached by topic, prompt, message, model and
+        temperature; `use_cache=False` always asks the model.
+        """
+        system_message = self.system_prompt(topic)
         self.logger.info(f"Start processing {topic}: {message}")
-        system_message: str = self.system_prompts[topic]
-        tokens = self.client.tokens_count(
-            [system_message, message], model=self.llm.model
+        if not use_cache or not self.cache.config.enabled:
+            return await self._chat(topic, system_message, message)
+
+        key = self.cache.key(
+            topic, system_message, message, self.llm.model, self.temperature
         )
-        self.logger.info(f"Total tokens: {tokens}")
+        if (cached := self.cache.get(key)) is not None:
+            self.logger.info(f"Response for {topic} found in cache")
+            return AIMessage(content=cached["content"])
+        if key not in self._inflight:
+            task = asyncio.create_task(self._chat(topic, system_message, message))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._remember, key))
+        # A cancelled caller leaves the call running for the others
+        return await asyncio.shield(self._inflight[key])
+
+    def _remember(self, key: str, task: asyncio.Task) -> None:
+        """Cache the result of a shared call once, whoever waits for it"""
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.cache.put(key, {"content": response.content}, usage.get("total_tokens", 0))
+
+    @retrying("chat")
+    async def _chat(self, topic: str, system_message: str, message: str) -> BaseMessage:
+        tokens = await self.count_tokens(topic, message)
+        self.logger.info(f"Estimated tokens: {tokens}")
         messages = [
             {"role": "system", "content": system_message},
             {"role": "user", "content": message},
@@ -96,12 +149,128 @@ class GigaChatLLM(Handler):
         async with self.semaphore:
             response: BaseMessage = await self.llm.ainvoke(messages)
         self.logger.info(f"Response: {response=}")
+        # Prompt tokens billed for the request are an exact count for free
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("input_tokens"):
+            self.estimator.calibrate(
+                f"{system_message}\n{message}", usage["input_tokens"]
+            )
         return response
 
+    async def summarize(
+        self, topic: str, utterances: list[str], use_cache: bool = True
+    ) -> BaseMessage:
+        """
+        Process a transcript with a topic, by chunks if it is too long.
+
+        A transcript over `chunk_tokens` is split on utterance boundaries,
+        the chunks are summarized concurrently with the chunk topic and the
+        summaries are processed with `topic` as one message. The estimate
+        is confirmed by an exact count when it is close to the limit.
+        `use_cache` applies to every request made on the way.
+        """
+        text = " ".join(utterances)
+        budget = self.config.chunk_tokens
+        if not budget or self.config.chunk_topic not in self.system_prompts:
+            return await self.handle(topic, text, use_cache)
+
+        tokens = await self.count_tokens(topic, text)
+        if abs(tokens - budget) < budget / 4:
+            tokens = await self.count_tokens(topic, text, exact=True)
+        if tokens <= budget:
+            return await self.handle(topic, text, use_cache)
+
+        chunks = self.split(utterances, self.config.chunk_topic)
+        self.logger.info(f"Transcript of {tokens} tokens split into {len(chunks)}")
+        summaries = await asyncio.gather(
+            *(
+                self.handle(self.config.chunk_topic, chunk, use_cache)
+                for chunk in chunks
+            )
+        )
+        return await self.handle(
+            topic, "\n\n".join(summary.content for summary in summaries), use_cache
+        )
+
+    def split(self, utterances: list[str], topic: str) -> list[str]:
+        """Pack utterances into texts that fit `chunk_tokens` with a topic"""
+        budget = self.config.chunk_tokens - self.estimator.prompt(
+            topic, self.system_prompt(topic)
+        )
+        chunks: list[str] = []
+        current: list[str] = []
+        size = 0
+        for utterance in utterances:
+            tokens = self.estimator.estimate(utterance) + 1
+            if current and size + tokens > budget:
+                chunks.append(" ".join(current))
+                current, size = [], 0
+            current.append(utterance)
+            size += tokens
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    async def count_tokens(self, topic: str, message: str, exact: bool = False) -> int:
+        """
+        Prompt size of a request to a topic.
+
+        Estimated locally by default. `exact` asks the API, for decisions
+        that must not overrun the context; the system prompt is counted
+        there only once per topic.
+        """
+        system_message = self.system_prompt(topic)
+        if not exact:
+            prompt_tokens = self.estimator.prompt(topic, system_message)
+            return prompt_tokens + self.estimator.estimate(message)
+        if self.estimator.is_exact(topic):
+            (tokens,) = await self._tokens_count([message])
+        else:
+            prompt_tokens, tokens = await self._tokens_count([system_message, message])
+            self.estimator.set_prompt(topic, system_message, prompt_tokens)
+        self.estimator.calibrate(message, tokens)
+        return self.estimator.prompt(topic, system_message) + tokens
+
+    @retrying("tokens_count")
+    async def _tokens_count(self, texts: list[str]) -> list[int]:
+        counts = await self.client.atokens_count(texts, model=self.llm.model)
+        return [count.tokens for count in counts]
+
+    def stats(self) -> dict:
+        return {
+            "cache": self.cache.stats(),
+            "estimator": self.estimator.stats(),
+            "tokens": self.tokens.stats(),
+            "retry": self.retry.stats(),
+        }
+
     def stop(self):
+        self.tokens.stop()
+        self.cache.stop()
         return super().stop()
 
 
+def is_retryable(error: BaseException) -> bool:
+    """Retry network errors, timeouts and throttling of the GigaChat API"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return is_retryable_status(error.response.status_code)
+    if isinstance(error, ResponseError):
+        status = getattr(error, "status_code", None)
+        if status is None and len(error.args) > 1:
+            # gigachat 0.1.x raises ResponseError(url, status_code, ...)
+            status = error.args[1]
+        return isinstance(status, int) and is_retryable_status(status)
+    return isinstance(
+        error,
+        (
+            TimeoutError,
+            httpx.TransportError,
+            httpcore.TimeoutException,
+            httpcore.NetworkError,
+        ),
+    )
+
+
 def parse_config(file_path: str) -> dict:
     with open(file_path, "r") as f:
         return yaml.safe_load(f)
@@ -0,0 +1,258 @@
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, Protocol
+
+
+CAPTURE_PATTERN = b"OggS"
+PAGE_HEADER = struct.Struct("<4sBBqIIIB")  # Without the segment table
+
+FLAG_CONTINUED = 0x01
+FLAG_BOS = 0x02
+FLAG_EOS = 0x04
+NO_GRANULE = -1  # No packet finishes on the page
+OPUS_SAMPLE_RATE = 48000  # Granule positions are always at 48 kHz
+
+# Ogg uses a non-reflected CRC-32 while zlib computes the reflected one,
+# so bytes and the result are bit-reversed around the zlib call
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+class Writable(Protocol):
+    def write(self, data: bytes | bytearray | memoryview) -> int: ...
+
+
+@dataclass(slots=True)
+class OggPage:
+    header_type: int
+    granule: int
+    serial: int
+    sequence: int
+    lacing: bytes
+    body: memoryview
+
+    @property
+    def ends_packet(self) -> bool:
+        """True if the last packet on the page is complete"""
+        return bool(self.lacing) and self.lacing[-1] < 255
+
+
+@dataclass(slots=True)
+class OpusHead:
+    channels: int
+    pre_skip: int
+    input_sample_rate: int
+
+
+def ogg_crc(data: bytes | bytearray) -> int:
+    """CRC-32 as defined by the Ogg spec (poly 0x04c11db7, init 0, no xor)"""
+    crc = zlib.crc32(data.translate(_REVERSED_BITS), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{crc:032b}"[::-1], 2)
+
+
+def iter_pages(data: bytes | memoryview) -> Iterator[OggPage]:
+    """
+    Iterate over pages of an Ogg stream without copying page bodies.
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        if len(view) - offset < PAGE_HEADER.size:
+            raise ValueError(f"Truncated Ogg page at {offset}")
+        (
+            pattern,
+            version,
+            header_type,
+            granule,
+            serial,
+            sequence,
+            _crc,
+            segments,
+        ) = PAGE_HEADER.unpack_from(view, offset)
+        if pattern != CAPTURE_PATTERN or version != 0:
+            raise ValueError(f"Invalid Ogg page at {offset}")
+        lacing_start = offset + PAGE_HEADER.size
+        body_start = lacing_start + segments
+        lacing = bytes(view[lacing_start:body_start])
+        body_end = body_start + sum(lacing)
+        if body_end > len(view):
+            raise ValueError(f"Truncated Ogg page at {offset}")
+        yield OggPage(
+            header_type, granule, serial, sequence, lacing, view[body_start:body_end]
+        )
+        offset = body_end
+
+
+def write_page(out: bytearray, page: OggPage) -> None:
+    start = len(out)
+    out += PAGE_HEADER.pack(
+        CAPTURE_PATTERN,
+        0,
+        page.header_type,
+        page.granule,
+        page.serial,
+        page.sequence,
+        0,
+        len(page.lacing),
+    )
+    out += page.lacing
+    out += page.body
+    crc = ogg_crc(out[start:])
+    struct.pack_into("<I", out, start + 22, crc)
+
+
+def parse_opus_head(data: bytes | memoryview) -> OpusHead:
+    """Read the identification header from the first page of an Ogg/Opus stream"""
+    first = next(iter_pages(data), None)
+    if first is None or bytes(first.body[:8]) != b"OpusHead":
+        raise ValueError("Not an Ogg/Opus stream")
+    channels = first.body[9]
+    pre_skip, input_sample_rate = struct.unpack_from("<HI", first.body, 10)
+    return OpusHead(channels, pre_skip, input_sample_rate)
+
+
+def _audio_pages(data: bytes | memoryview) -> Iterator[OggPage]:
+    """
+    Skip OpusHead and OpusTags pages and yield the audio pages.
+
+    OpusTags may span several pages but audio always starts on a new one.
+    """
+    pages = iter_pages(data)
+    head = next(pages)
+    tags_complete = False
+    for page in pages:
+        if page.serial != head.serial:
+            raise ValueError("Multiplexed or chained Ogg streams are not supported")
+        if not tags_complete:
+            tags_complete = page.ends_packet
+            continue
+        yield page
+
+
+# Frame sizes at 48 kHz by TOC config: SILK, hybrid and CELT modes
+_OPUS_FRAME_SIZES = (
+    [480, 960, 1920, 2880] * 3 + [480, 960] * 2 + [120, 240, 480, 960] * 4
+)
+
+
+def opus_packet_samples(packet: bytes) -> int:
+    """Samples at 48 kHz in an Opus packet, from its TOC byte (RFC 6716 3.1)"""
+    if not packet:
+        return 0
+    toc = packet[0]
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    elif len(packet) > 1:
+        frames = packet[1] & 0x3F
+    else:
+        raise ValueError("Truncated Opus packet")
+    return _OPUS_FRAME_SIZES[toc >> 3] * frames
+
+
+def stream_samples(data: bytes | memoryview) -> int:
+    """
+    Samples a decoder outputs for a whole Ogg/Opus stream, pre-skip and
+    end trimming included.
+
+    Only the first two bytes of every packet are read.
+    """
+    total = 0
+    packet = bytearray()
+    for page in _audio_pages(data):
+        position = 0
+        for lacing in page.lacing:
+            if len(packet) < 2:
+                packet += page.body[position : position + min(lacing, 2 - len(packet))]
+            position += lacing
+            if lacing < 255:
+                total += opus_packet_samples(packet)
+                packet.clear()
+    return total
+
+
+def concat_opus(
+    streams: list[bytes | memoryview], out: Writable
+) -> list[tuple[float, float, float]]:
+    """
+    Join Ogg/Opus streams at the page level, without decoding.
+
+    Headers of the first stream are kept; audio pages of the following
+    streams get its serial number, continuous page sequence numbers and
+    granule positions shifted by the samples already decoded.
+    Pages are written to `out` one by one.
+
+    Priming samples (pre-skip) of appended streams and end trimming of
+    all but the last one can not be cut without a decode, they stay in
+    the joined stream. The returned segments, as in `OffsetMap`, map the
+    decoded timeline back to the files played one after another.
+    Raises ValueError if the streams can not be joined losslessly.
+    """
+    if not streams:
+        raise ValueError("Nothing to join")
+    heads = [parse_opus_head(stream) for stream in streams]
+    if len({head.channels for head in heads}) != 1:
+        raise ValueError("Opus streams have different channel counts")
+    # Validate the whole input before anything is written
+    samples = [stream_samples(stream) for stream in streams]
+
+    page_data = bytearray()
+    pages = iter_pages(streams[0])
+    head_page = next(pages)
+    serial = head_page.serial
+    sequence = 0
+
+    # Headers of the first stream are copied unchanged
+    write_page(page_data, head_page)
+    for page in pages:
+        sequence += 1
+        write_page(page_data, page)
+        if page.ends_packet:
+            break
+    out.write(page_data)
+
+    segments = []
+    granule_offset = 0
+    original = 0
+    pending = None
+    for index, (stream, head) in enumerate(zip(streams, heads)):
+        last_granule = 0
+        for page in _audio_pages(stream):
+            sequence += 1
+            if page.granule != NO_GRANULE:
+                last_granule = page.granule
+                page.granule += granule_offset
+            page.serial = serial
+            page.sequence = sequence
+            page.header_type &= ~(FLAG_BOS | FLAG_EOS)
+            # The previous page is written once it is known not to be the last
+            if pending is not None:
+                page_data.clear()
+                write_page(page_data, pending)
+                out.write(page_data)
+            pending = page
+
+        # Playback starts after the pre-skip of the first stream only
+        playable = max(last_granule - head.pre_skip, 0)
+        decoded_start = granule_offset - heads[0].pre_skip + head.pre_skip
+        segments.append(
+            (
+                decoded_start / OPUS_SAMPLE_RATE,
+                original / OPUS_SAMPLE_RATE,
+                playable / OPUS_SAMPLE_RATE,
+            )
+        )
+        original += playable
+        granule_offset += max(samples[index], last_granule)
+        if pending is not None and index < len(streams) - 1:
+            # Trimmed samples are decoded when the stream goes on
+            pending.granule = granule_offset
+
+    if pending is not None:
+        pending.header_type |= FLAG_EOS
+        page_data.clear()
+        write_page(page_data, pending)
+        out.write(page_data)
+    return segments
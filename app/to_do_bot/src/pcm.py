@@ -0,0 +1,124 @@
+import struct
+from typing import Optional
+
+import numpy as np
+from pydub import AudioSegment
+
+
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2  # s16
+
+_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def output_length(segment: AudioSegment, rate: int = TARGET_SAMPLE_RATE) -> int:
+    """Number of samples the segment takes after resampling to `rate`"""
+    return int(round(int(segment.frame_count()) * rate / segment.frame_rate))
+
+
+def to_mono_float(segment: AudioSegment) -> np.ndarray:
+    """
+    Downmix a segment to mono float32 in the [-1, 1) range.
+    """
+    width = segment.sample_width
+    if width not in _DTYPES:
+        segment = segment.set_sample_width(TARGET_SAMPLE_WIDTH)
+        width = TARGET_SAMPLE_WIDTH
+    samples = np.frombuffer(segment.raw_data, dtype=_DTYPES[width])
+    samples = samples.reshape(-1, segment.channels).astype(np.float32)
+    if width == 1:
+        samples -= 128.0  # 8-bit PCM is unsigned
+    mono = samples.mean(axis=1) if segment.channels > 1 else samples[:, 0]
+    return mono / float(1 << (8 * width - 1))
+
+
+def resample(
+    samples: np.ndarray, src_rate: int, dst_rate: int, size: int
+) -> np.ndarray:
+    """
+    Resample with linear interpolation to exactly `size` samples.
+
+    When downsampling by an integer factor or more the signal is first
+    averaged over that many samples to keep aliasing out of the speech band.
+    """
+    if src_rate == dst_rate and len(samples) == size:
+        return samples
+    factor = src_rate // dst_rate
+    if factor > 1:
+        usable = len(samples) - len(samples) % factor
+        samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+        src_rate = src_rate / factor
+    if not len(samples) or not size:
+        return np.zeros(size, dtype=np.float32)
+    positions = np.arange(size, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def normalize_segments(
+    segments: list[AudioSegment],
+    rate: int = TARGET_SAMPLE_RATE,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Downmix, resample and join segments into one preallocated s16 array.
+
+    `out` may be passed to write into existing memory, it must hold exactly
+    the total number of output samples.
+    """
+    sizes = [output_length(segment, rate) for segment in segments]
+    if out is None:
+        out = np.empty(sum(sizes), dtype=np.int16)
+    elif len(out) != sum(sizes):
+        raise ValueError("Output array has a wrong size")
+    offset = 0
+    for segment, size in zip(segments, sizes):
+        mono = resample(to_mono_float(segment), segment.frame_rate, rate, size)
+        chunk = out[offset : offset + size]
+        np.clip(mono * 32768.0, -32768, 32767, out=mono)
+        chunk[:] = mono
+        offset += size
+    return out
+
+
+def normalize_to_wav(
+    segments: list[AudioSegment], rate: int = TARGET_SAMPLE_RATE
+) -> np.ndarray:
+    """
+    Normalize segments into a WAV file laid out in a single byte array.
+
+    The samples are written straight after the header, so the array can be
+    handed to an `AudioBuffer` as is.
+    """
+    total = sum(output_length(segment, rate) for segment in segments)
+    header = wav_header(total * TARGET_SAMPLE_WIDTH, rate)
+    wav = np.empty(len(header) + total * TARGET_SAMPLE_WIDTH, dtype=np.uint8)
+    wav[: len(header)] = np.frombuffer(header, dtype=np.uint8)
+    normalize_segments(segments, rate, out=wav[len(header) :].view("<i2"))
+    return wav
+
+
+def wav_header(
+    data_size: int, rate: int = TARGET_SAMPLE_RATE, channels: int = 1
+) -> bytes:
+    """Canonical 44-byte header for PCM_S16LE"""
+    block_align = channels * TARGET_SAMPLE_WIDTH
+    return b"".join(
+        (
+            b"RIFF",
+            struct.pack("<I", 36 + data_size),
+            b"WAVEfmt ",
+            struct.pack(
+                "<IHHIIHH",
+                16,
+                1,
+                channels,
+                rate,
+                rate * block_align,
+                block_align,
+                8 * TARGET_SAMPLE_WIDTH,
+            ),
+            b"data",
+            struct.pack("<I", data_size),
+        )
+    )
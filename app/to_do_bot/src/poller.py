@@ -0,0 +1,168 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from src.enums import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+StatusCheck = Callable[[str], Awaitable[tuple[TaskStatus, str]]]
+
+FINAL_STATUSES = {TaskStatus.DONE, TaskStatus.CANCELED, TaskStatus.ERROR}
+
+
+class StatusPollerConfig(BaseSettings):
+    min_interval: float = Field(2.0, alias="CHECK_INTERVAL")
+    max_interval: float = Field(30.0, alias="STT_POLL_MAX_INTERVAL")
+    growth: float = Field(0.25, alias="STT_POLL_GROWTH")
+    realtime_factor: float = Field(0.1, alias="STT_REALTIME_FACTOR")
+    concurrency: int = Field(2, alias="STT_POLL_CONCURRENCY")
+    max_wait: float = Field(3600.0, alias="STT_MAX_WAIT")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+@dataclass(order=True)
+class _Watch:
+    due: float
+    task_id: str = field(compare=False)
+    duration: Optional[float] = field(compare=False)
+    started: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    polls: int = field(default=0, compare=False)
+
+
+class StatusPoller:
+    """
+    One background loop polling the status of all outstanding STT tasks.
+
+    A task is first checked after about `realtime_factor` of its duration,
+    then at intervals growing with the time already waited, bounded by
+    `min_interval` and `max_interval`. `wait` resolves with the final
+    status and response file id.
+    """
+
+    def __init__(self, check: StatusCheck, *args, **kwargs) -> None:
+        self.config = StatusPollerConfig(*args, **kwargs)
+        self._check = check
+        self._queue: list[_Watch] = []
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.config.concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._polls: set[asyncio.Task] = set()
+        self.requests = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue) + len(self._polls)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(
+                self._run(), name="stt_status_poller"
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for poll in self._polls:
+            poll.cancel()
+        for watch in self._queue:
+            watch.future.cancel()
+        self._queue.clear()
+
+    def first_delay(self, duration: Optional[float]) -> float:
+        """
+        Skip polls that can not succeed: recognition of a probed recording
+        takes about `realtime_factor` of its duration.
+        """
+        if not duration:
+            return self.config.min_interval
+        return max(self.config.min_interval, duration * self.config.realtime_factor)
+
+    def next_interval(self, waited: float) -> float:
+        return min(
+            self.config.max_interval,
+            max(self.config.min_interval, waited * self.config.growth),
+        )
+
+    async def wait(
+        self, task_id: str, duration: Optional[float] = None
+    ) -> tuple[TaskStatus, str]:
+        """Wait until the task reaches a final status"""
+        if self._task is None:
+            raise RuntimeError("Poller not started")
+        now = time.monotonic()
+        watch = _Watch(
+            due=now + self.first_delay(duration),
+            task_id=task_id,
+            duration=duration,
+            started=now,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._schedule(watch)
+        return await watch.future
+
+    def _schedule(self, watch: _Watch) -> None:
+        heapq.heappush(self._queue, watch)
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._queue:
+                await self._wakeup.wait()
+                continue
+            delay = self._queue[0].due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            watch = heapq.heappop(self._queue)
+            if watch.future.done():
+                continue  # The waiter was cancelled
+            poll = asyncio.create_task(self._poll(watch))
+            self._polls.add(poll)
+            poll.add_done_callback(self._polls.discard)
+
+    async def _poll(self, watch: _Watch) -> None:
+        async with self._semaphore:
+            if watch.future.done():
+                return
+            self.requests += 1
+            watch.polls += 1
+            try:
+                status, response_id = await self._check(watch.task_id)
+            except Exception as e:
+                logger.warning(f"Status check of {watch.task_id} failed: {e}")
+                status, response_id = None, ""
+
+        waited = time.monotonic() - watch.started
+        if watch.future.done():
+            return
+        if status in FINAL_STATUSES:
+            logger.info(
+                f"Task {watch.task_id} is {status.value} after {waited:.1f}s "
+                f"and {watch.polls} polls"
+            )
+            watch.future.set_result((status, response_id))
+            return
+        if waited > self.config.max_wait:
+            watch.future.set_exception(
+                TimeoutError(f"Task {watch.task_id} not finished in {waited:.0f}s")
+            )
+            return
+        watch.due = time.monotonic() + self.next_interval(waited)
+        self._schedule(watch)
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self.pending, "requests": self.requests}
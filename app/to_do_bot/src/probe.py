@@ -0,0 +1,333 @@
+import struct
+from typing import NamedTuple, Optional
+
+from src.buffer import AudioBuffer
+from src.ogg import FLAG_EOS
+
+
+HEADER_SIZE = 64  # Bytes needed to recognize a container
+PROBE_SIZE = 64 * 1024  # Head and tail sizes read by a duration probe
+OPUS_GRANULE_RATE = 48000
+
+# MPEG audio frame header tables
+_MP3_BITRATES = {
+    # (MPEG-1, layer) and (MPEG-2/2.5, layer) in kbit/s
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],  # MPEG-2.5
+}
+
+
+class WavParams(NamedTuple):
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+
+
+class StreamParams(NamedTuple):
+    channels: int
+    sample_rate: int
+
+
+class Mp3Frame(NamedTuple):
+    offset: int  # Of the frame header in the payload
+    version_bits: int
+    layer: int
+    bitrate: int  # bit/s
+    sample_rate: int
+    channel_mode: int  # 3 is mono
+    padding: int = 0
+
+    @property
+    def channels(self) -> int:
+        return 1 if self.channel_mode == 3 else 2
+
+    @property
+    def mpeg1(self) -> bool:
+        return self.version_bits == 3
+
+    @property
+    def samples_per_frame(self) -> int:
+        if self.layer == 1:
+            return 384
+        if self.layer == 3 and not self.mpeg1:
+            return 576
+        return 1152
+
+    @property
+    def size(self) -> int:
+        """Frame length in bytes, header included"""
+        if self.layer == 1:
+            return (12 * self.bitrate // self.sample_rate + self.padding) * 4
+        length = self.samples_per_frame // 8 * self.bitrate // self.sample_rate
+        return length + self.padding
+
+    @property
+    def xing_offset(self) -> int:
+        """Where a Xing/Info tag would start, after the side information"""
+        if self.mpeg1:
+            side_info = 17 if self.channel_mode == 3 else 32
+        else:
+            side_info = 9 if self.channel_mode == 3 else 17
+        return self.offset + 4 + side_info
+
+
+class ProbeResult(NamedTuple):
+    format: Optional[str]
+    duration: Optional[float]  # Seconds, None when headers are not enough
+    size: Optional[int]
+
+
+def read_header(
+    data: bytes | memoryview | AudioBuffer, size: int = HEADER_SIZE
+) -> bytes:
+    """Return the first `size` bytes without copying the whole payload"""
+    if isinstance(data, AudioBuffer):
+        data = data.view()
+    return bytes(data[:size])
+
+
+def detect_format(data: bytes | memoryview | AudioBuffer) -> Optional[str]:
+    """
+    Detect the container from its magic bytes.
+
+    Returns an `AudioFormat` extension name ('ogg', 'mp3', 'wav', 'flac')
+    or None when the payload is not something Salute accepts as is.
+    Ogg is only reported for Opus streams, Ogg/Vorbis is not supported.
+    """
+    header = read_header(data)
+    if header.startswith(b"OggS") and len(header) > 27:
+        payload_offset = 27 + header[26]
+        if header[payload_offset : payload_offset + 8] == b"OpusHead":
+            return "ogg"
+        return None
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "wav"
+    if header.startswith(b"fLaC"):
+        return "flac"
+    if header.startswith(b"ID3"):
+        return "mp3"
+    # MPEG audio frame sync; layer bits are 00 for AAC ADTS
+    if len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        if (header[1] >> 1) & 0x03:
+            return "mp3"
+    return None
+
+
+def parse_wav_params(data: bytes | memoryview | AudioBuffer) -> Optional[WavParams]:
+    """Read channel count, sample rate and sample width from a WAV header"""
+    header = read_header(data)
+    if not (header.startswith(b"RIFF") and header[8:12] == b"WAVE"):
+        return None
+    if header[12:16] != b"fmt ":
+        return None
+    audio_format, channels, sample_rate = struct.unpack_from("<HHI", header, 20)
+    (bits_per_sample,) = struct.unpack_from("<H", header, 34)
+    if audio_format != 1:  # Not integer PCM
+        return None
+    return WavParams(channels, sample_rate, bits_per_sample)
+
+
+def id3_size(data: bytes | memoryview) -> int:
+    """Size of a leading ID3v2 tag, 0 if there is none"""
+    if bytes(data[:3]) != b"ID3" or len(data) < 10:
+        return 0
+    # Tag size is a 28-bit synchsafe integer
+    tag_size = 0
+    for byte in bytes(data[6:10]):
+        tag_size = (tag_size << 7) | (byte & 0x7F)
+    return 10 + tag_size
+
+
+def parse_mp3_frame(data: bytes | memoryview, offset: int = 0) -> Optional[Mp3Frame]:
+    """Read the MPEG audio frame header at `offset`"""
+    if offset + 4 > len(data):
+        return None
+    (header,) = struct.unpack_from(">I", data, offset)
+    if header >> 21 != 0x7FF:
+        return None
+    version_bits = (header >> 19) & 0x03
+    layer = 4 - ((header >> 17) & 0x03)
+    bitrate_index = (header >> 12) & 0x0F
+    rate_index = (header >> 10) & 0x03
+    channel_mode = (header >> 6) & 0x03
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    return Mp3Frame(
+        offset,
+        version_bits,
+        layer,
+        _MP3_BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index] * 1000,
+        _MP3_SAMPLE_RATES[version_bits][rate_index],
+        channel_mode,
+        (header >> 9) & 0x01,
+    )
+
+
+def mp3_info_frame(data: bytes | memoryview, frame: Mp3Frame) -> bool:
+    """
+    Whether the frame carries a Xing/Info or VBRI tag instead of audio.
+
+    Such a frame describes the frame and byte counts of the whole file.
+    """
+    return bytes(data[frame.xing_offset : frame.xing_offset + 4]) in (
+        b"Xing",
+        b"Info",
+    ) or bytes(data[frame.offset + 36 : frame.offset + 40]) == b"VBRI"
+
+
+def parse_stream_params(
+    data: bytes | memoryview | AudioBuffer, audio_format: Optional[str]
+) -> Optional[StreamParams]:
+    """
+    Read channel count and sample rate of a payload Salute takes as is.
+
+    Opus is always decoded at 48 kHz whatever rate it was recorded at.
+    Returns None when the headers can not be read.
+    """
+    view = data.view() if isinstance(data, AudioBuffer) else memoryview(data)
+    try:
+        if audio_format == "ogg":
+            payload = 27 + view[26]
+            if bytes(view[payload : payload + 8]) != b"OpusHead":
+                return None
+            return StreamParams(view[payload + 9], OPUS_GRANULE_RATE)
+        if audio_format == "mp3":
+            frame = parse_mp3_frame(view, id3_size(view))
+            return StreamParams(frame.channels, frame.sample_rate) if frame else None
+        if audio_format == "flac":
+            (packed,) = struct.unpack_from(">Q", view, 8 + 10)
+            return StreamParams(((packed >> 41) & 0x07) + 1, packed >> 44)
+        if audio_format == "wav":
+            params = parse_wav_params(view)
+            return StreamParams(params.channels, params.sample_rate) if params else None
+    except (struct.error, IndexError):
+        return None
+    return None
+
+
+def find_wav_data(data: bytes | memoryview | AudioBuffer) -> Optional[tuple[int, int]]:
+    """
+    Locate the `data` chunk of a WAV file.
+
+    Returns (offset, size) of the samples, walking over any extra chunks
+    such as LIST. The size is clamped to the payload for streamed headers.
+    """
+    view = data.view() if isinstance(data, AudioBuffer) else memoryview(data)
+    if bytes(view[:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        return None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset : offset + 4])
+        (chunk_size,) = struct.unpack_from("<I", view, offset + 4)
+        if chunk_id == b"data":
+            start = offset + 8
+            return start, min(chunk_size, len(view) - start)
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def probe_duration(
+    head: bytes, tail: bytes = b"", size: Optional[int] = None
+) -> ProbeResult:
+    """
+    Estimate duration from container headers only.
+
+    `head` and `tail` are the first and last bytes of the file (the tail is
+    needed for Ogg, whose length is in the granule of the last page, and
+    must reach the end of the file) and
+    `size` is the full file size. Nothing is decoded.
+    """
+    audio_format = detect_format(head)
+    probes = {
+        "ogg": _probe_ogg,
+        "wav": _probe_wav,
+        "mp3": _probe_mp3,
+        "flac": _probe_flac,
+    }
+    duration = None
+    if audio_format in probes:
+        try:
+            duration = probes[audio_format](head, tail, size)
+        except (struct.error, IndexError, ValueError, ZeroDivisionError):
+            duration = None
+    return ProbeResult(audio_format, duration, size)
+
+
+def _probe_ogg(head: bytes, tail: bytes, size: Optional[int]) -> Optional[float]:
+    payload = 27 + head[26]
+    (pre_skip,) = struct.unpack_from("<H", head, payload + 10)
+    # A tail that is not the end of the stream, e.g. when the server
+    # ignored Range, would give the granule of some page in the middle
+    last_page = tail.rfind(b"OggS")
+    if last_page < 0 or last_page + 14 > len(tail):
+        return None
+    if not tail[last_page + 5] & FLAG_EOS:
+        return None
+    (granule,) = struct.unpack_from("<q", tail, last_page + 6)
+    if granule < 0:
+        return None
+    return max(granule - pre_skip, 0) / OPUS_GRANULE_RATE
+
+
+def _probe_wav(head: bytes, tail: bytes, size: Optional[int]) -> Optional[float]:
+    params = parse_wav_params(head)
+    location = find_wav_data(head)
+    if params is None or location is None:
+        return None
+    offset, _ = location
+    (data_size,) = struct.unpack_from("<I", head, offset - 4)
+    if size is not None and (data_size in (0, 0xFFFFFFFF) or offset + data_size > size):
+        data_size = size - offset  # Streamed header without real sizes
+    bytes_per_second = (
+        params.sample_rate * params.channels * params.bits_per_sample // 8
+    )
+    return data_size / bytes_per_second
+
+
+def _probe_flac(head: bytes, tail: bytes, size: Optional[int]) -> Optional[float]:
+    # STREAMINFO is always the first metadata block
+    (packed,) = struct.unpack_from(">Q", head, 8 + 10)
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+def _probe_mp3(head: bytes, tail: bytes, size: Optional[int]) -> Optional[float]:
+    offset = id3_size(head)
+    # With large cover art the frame is out of the head, no CBR guess then
+    frame = parse_mp3_frame(head, offset)
+    if frame is None:
+        return None
+    sample_rate = frame.sample_rate
+    samples_per_frame = frame.samples_per_frame
+
+    # Xing/Info (VBR and LAME CBR) sits after the side information
+    for tag_offset, tag in (
+        (frame.xing_offset, (b"Xing", b"Info")),
+        (offset + 36, (b"VBRI",)),
+    ):
+        if head[tag_offset : tag_offset + 4] not in tag:
+            continue
+        if tag == (b"VBRI",):
+            (frames,) = struct.unpack_from(">I", head, tag_offset + 14)
+            return frames * samples_per_frame / sample_rate
+        (flags,) = struct.unpack_from(">I", head, tag_offset + 4)
+        if flags & 0x01:
+            (frames,) = struct.unpack_from(">I", head, tag_offset + 8)
+            return frames * samples_per_frame / sample_rate
+
+    if size is None:
+        return None
+    return (size - offset) * 8 / frame.bitrate
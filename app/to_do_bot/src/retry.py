@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = {408, 425, 429}
+
+
+class RetryConfig(BaseSettings):
+    max_tries: int = Field(4, alias="RETRY_MAX_TRIES")
+    base_delay: float = Field(0.5, alias="RETRY_BASE_DELAY")
+    max_delay: float = Field(10.0, alias="RETRY_MAX_DELAY")
+    max_time: float = Field(30.0, alias="RETRY_MAX_TIME")
+    budget_ratio: float = Field(0.2, alias="RETRY_BUDGET_RATIO")
+    budget_min: int = Field(10, alias="RETRY_BUDGET_MIN")
+    budget_window: float = Field(60.0, alias="RETRY_BUDGET_WINDOW")
+    failure_threshold: int = Field(5, alias="CIRCUIT_FAILURE_THRESHOLD")
+    reset_timeout: float = Field(30.0, alias="CIRCUIT_RESET_TIMEOUT")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class CircuitOpenError(Exception):
+    """The endpoint failed repeatedly, calls fail fast until it recovers"""
+
+
+def is_retryable_status(status: int) -> bool:
+    return status in RETRYABLE_STATUSES or status >= 500
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Default classification for aiohttp clients.
+
+    Network errors, timeouts, 5xx, 429 and friends are retried; other 4xx
+    and application errors are not, retrying them only adds load.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return is_retryable_status(error.status)
+    return isinstance(error, (aiohttp.ClientConnectionError, TimeoutError))
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of requests over a sliding window.
+
+    `budget_min` retries per window are always allowed so a quiet bot can
+    still retry; past that, an outage does not multiply the load.
+    """
+
+    def __init__(self, ratio: float, minimum: int, window: float) -> None:
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_request(self) -> None:
+        self._requests.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.minimum + self.ratio * len(self._requests):
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> dict[str, int]:
+        self._trim(time.monotonic())
+        return {"requests": len(self._requests), "retries": len(self._retries)}
+
+
+_budget: Optional[RetryBudget] = None
+
+
+def get_budget() -> RetryBudget:
+    """Retry budget shared by all clients of the process"""
+    global _budget
+    if _budget is None:
+        config = RetryConfig()
+        _budget = RetryBudget(
+            config.budget_ratio, config.budget_min, config.budget_window
+        )
+    return _budget
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures.
+
+    While open, calls raise `CircuitOpenError` at once. After
+    `reset_timeout` a single probe call is let through, its outcome closes
+    or reopens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) expires
+        probing = (
+            self._probe_at is not None and now - self._probe_at < self.reset_timeout
+        )
+        if state == "open" or (state == "half_open" and probing):
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+        if state == "half_open":
+            self._probe_at = now
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info(f"Circuit {self.name} closed")
+        self.failures = 0
+        self._opened_at = None
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        probing = self._probe_at is not None
+        if probing or self.failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning(
+                    f"Circuit {self.name} opened after {self.failures} failures"
+                )
+            self._opened_at = time.monotonic()
+            self._probe_at = None
+
+
+class RetryPolicy:
+    """
+    Retries with exponential backoff and full jitter for one client.
+
+    Each endpoint has its own circuit breaker; retries are drawn from the
+    process-wide `RetryBudget`. `classify` decides which errors are worth
+    retrying, only those count as endpoint failures.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *args,
+        classify: Callable[[BaseException], bool] = is_retryable,
+        **kwargs,
+    ) -> None:
+        self.config = RetryConfig(*args, **kwargs)
+        self.name = name
+        self.classify = classify
+        self.budget = get_budget()
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(
+                f"{self.name}:{endpoint}",
+                self.config.failure_threshold,
+                self.config.reset_timeout,
+            )
+        return self.breakers[endpoint]
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.config.max_delay, self.config.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, delay)
+
+    async def call(
+        self,
+        endpoint: str,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+        max_tries: Optional[int] = None,
+        **kwargs: Any,
+    ) -> T:
+        breaker = self.breaker(endpoint)
+        max_tries = max_tries or self.config.max_tries
+        started = time.monotonic()
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self.classify(e):
+                    # The endpoint answered, the request itself is wrong
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                delay = self.backoff(attempt)
+                if (
+                    attempt >= max_tries
+                    or breaker.state != "closed"
+                    or time.monotonic() - started + delay > self.config.max_time
+                    or not self.budget.try_retry()
+                ):
+                    raise
+                logger.info(
+                    f"Retrying {self.name}:{endpoint} in {delay:.2f}s "
+                    f"(attempt {attempt}/{max_tries}): {e!r}"
+                )
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "breakers": {name: b.state for name, b in self.breakers.items()},
+            "budget": self.budget.stats(),
+        }
+
+
+def retrying(endpoint: str, max_tries: Optional[int] = None):
+    """
+    Method decorator running the call through the instance's `self.retry`.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            return await self.retry.call(
+                endpoint, func, self, *args, max_tries=max_tries, **kwargs
+            )
+
+        return wrapper
+
+    return decorator
@@ -1,23 +1,28 @@
-import json
-from typing import Coroutine
 import aiohttp
 import asyncio
-from typing import Any
+import functools
+import operator
+from typing import Any, AsyncIterable, Callable, Optional
 import logging
-import datetime
 import ssl
-import aiohttp.client_exceptions as aiohttp_client_exp
-import backoff
 import certifi
 import uuid
 
-from pydantic import Field
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+from src.batcher import ChannelBatcher
 from src.client import BaseHTTPClient, HTTPMethods
+from src.concurrency import AdaptiveLimiter
 from src.enums import AudioFormat, TaskStatus
-from src.schemas import Audio, TranscriptionItem
+from src.journal import JobJournal, JournalJob, JournalTask
+from src.poller import StatusPoller
+from src.retry import RetryPolicy, is_retryable, retrying
+from src.schemas import Audio, LazyTranscriptionItem, parse_transcription
+from src.token_manager import TokenManager
+from src.upload import UPLOAD_CHUNK_SIZE, multipart_upload
+from src.vad import split_audio
 
 from src.handler import Handler
 
@@ -26,9 +31,26 @@ logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
+ENDPOINTS = ("token", "upload", "recognize", "status", "download")
+# Upload and download times depend on the payload size, not on the load
+SIZE_BOUND_ENDPOINTS = {"upload", "download"}
+
+
+class SaluteAccountConfig(BaseModel):
+    """
+    One entry of `SALUTE_ACCOUNTS`, unset fields fall back to the
+    `SALUTE_*` settings.
+    """
+
+    name: Optional[str] = None
+    credentials: str
+    scope: Optional[str] = None
+    url_access_token: Optional[str] = None
+    url_rest: Optional[str] = None
+
 
 class SaluteSpeechConfig(BaseSettings):
-    credentials: str = Field(..., alias="SALUTE_CREDENTIALS")
+    credentials: Optional[str] = Field(None, alias="SALUTE_CREDENTIALS")
     scope: str = Field("SALUTE_SPEECH_PERS", alias="SALUTE_SCOPE")
     url_access_token: str = Field(
         "https://ngw.devices.sberbank.ru:9443/api/v2/oauth",
@@ -37,74 +59,109 @@ class SaluteSpeechConfig(BaseSettings):
     url_rest: str = Field(
         "https://smartspeech.sber.ru/rest/v1", alias="SALUTE_REST_URL"
     )
+    accounts: list[SaluteAccountConfig] = Field([], alias="SALUTE_ACCOUNTS")
     check_interval: float = Field(2.0, alias="CHECK_INTERVAL")
+    chunk_duration: float = Field(300.0, alias="STT_CHUNK_DURATION")
+    chunk_min_duration: float = Field(600.0, alias="STT_CHUNK_MIN_DURATION")
+    chunk_search: float = Field(20.0, alias="STT_CHUNK_SEARCH")
+    upload_chunk_size: int = Field(UPLOAD_CHUNK_SIZE, alias="STT_UPLOAD_CHUNK_SIZE")
+    hedge_factor: float = Field(0.0, alias="STT_HEDGE_FACTOR")
+    hedge_min_delay: float = Field(60.0, alias="STT_HEDGE_MIN_DELAY")
 
     model_config = SettingsConfigDict(extra="ignore")
     simultaneous_requests: int = Field(3, alias="SALUTE_SIMULTANEOUS_REQUESTS")
 
+    @model_validator(mode="after")
+    def check_credentials(self):
+        if not self.credentials and not self.accounts:
+            raise ValueError("SALUTE_CREDENTIALS or SALUTE_ACCOUNTS must be set")
+        return self
+
+    def account_configs(self) -> list[SaluteAccountConfig]:
+        """Accounts of the pool with defaults filled in"""
+        if not self.accounts:
+            return [
+                SaluteAccountConfig(
+                    name="default",
+                    credentials=self.credentials,
+                    scope=self.scope,
+                    url_access_token=self.url_access_token,
+                    url_rest=self.url_rest,
+                )
+            ]
+        return [
+            SaluteAccountConfig(
+                name=account.name or f"account{index}",
+                credentials=account.credentials,
+                scope=account.scope or self.scope,
+                url_access_token=account.url_access_token or self.url_access_token,
+                url_rest=account.url_rest or self.url_rest,
+            )
+            for index, account in enumerate(self.accounts)
+        ]
 
-class SaluteSpeechHandler(Handler):
-    class Config(SaluteSpeechConfig):
-        name: str = Field(default="SaluteSpeechASR")
-
-    def __init__(self, *args, **kwargs) -> None:
-        self._access_token = None
-        self._is_running = False
-        self.config = self.Config(*args, **kwargs)
-        self.ssl_default_context = ssl.create_default_context(cadata=certifi.contents())
-        self._connector = None
-        self.timeout = aiohttp.ClientTimeout(total=30, connect=10)
-        resolver = aiohttp.AsyncResolver()
-        self._connector = aiohttp.TCPConnector(
-            resolver=resolver,
-            ssl_context=self.ssl_default_context,
-            keepalive_timeout=15,
-            limit=None,
-            limit_per_host=0,
-            enable_cleanup_closed=True,
-        )
-        self.http_client = BaseHTTPClient(self._connector)
-        self.semaphore = asyncio.Semaphore(self.config.simultaneous_requests)
-
-    token_lock = asyncio.Lock()
-
-    async def get_access_token(self):
-        async with self.token_lock:
-            return self.access_token
 
-    async def set_access_token(self, token: str):
-        async with self.token_lock:
-            self.access_token = token
+class SaluteAccount:
+    """
+    Requests of one Salute account: its token, concurrency limits, retry
+    policy and status poller.
 
-    @property
-    def credentials(self) -> str:
-        return self.config.credentials
+    `outstanding` is the audio in seconds routed to the account and not
+    recognized yet, the handler sends new work to the least loaded one.
+    """
 
-    @property
-    def scope(self) -> str:
-        return self.config.scope
-
-    @property
-    def url_access_token(self) -> str:
-        return self.config.url_access_token
-
-    @property
-    def url_rest(self) -> str:
-        return self.config.url_rest
+    def __init__(
+        self,
+        config: SaluteAccountConfig,
+        http_client: BaseHTTPClient,
+        simultaneous_requests: int,
+        upload_chunk_size: int,
+        *args,
+        **kwargs,
+    ) -> None:
+        self.config = config
+        self.name = config.name
+        self.http_client = http_client
+        self.upload_chunk_size = upload_chunk_size
+        # Every endpoint class starts at `simultaneous_requests` and adapts
+        # on its own, so slow uploads do not hold back status polls
+        self.limiters = {
+            endpoint: AdaptiveLimiter(
+                f"salute:{self.name}:{endpoint}",
+                simultaneous_requests,
+                *args,
+                latency_sensitive=endpoint not in SIZE_BOUND_ENDPOINTS,
+                **kwargs,
+            )
+            for endpoint in ENDPOINTS
+        }
+        self.retry = RetryPolicy(
+            f"salute:{self.name}", *args, classify=is_retryable_salute, **kwargs
+        )
+        self.poller = StatusPoller(self.handle_status, *args, **kwargs)
+        self.tokens = TokenManager(
+            self._fetch_access_token, f"salute:{self.name}", *args, **kwargs
+        )
+        self.outstanding = 0.0
+        self.assigned = 0
 
     @property
-    def check_interval(self) -> float:
-        return self.config.check_interval
+    def available(self) -> bool:
+        """Has a token and its recognition endpoints are not failing"""
+        return self.tokens.valid and all(
+            self.retry.breaker(endpoint).state != "open"
+            for endpoint in ("upload", "recognize")
+        )
 
-    async def _handle(self, action: str, *args: Any, **kwargs: Any) -> Any:
-        if not self._is_running:
-            raise RuntimeError("Handler not started")
+    def reserve(self, seconds: float) -> None:
+        self.outstanding += seconds
+        self.assigned += 1
 
-        handler = getattr(self, f"handle_{action}", None)
-        if not handler:
-            raise ValueError(f"Unknown action: {action}")
+    def release(self, seconds: float) -> None:
+        self.outstanding -= seconds
 
-        return await handler(*args, **kwargs)
+    async def get_access_token(self) -> str:
+        return await self.tokens.get()
 
     async def make_request(
         self,
@@ -113,9 +170,11 @@ class SaluteSpeechHandler(Handler):
         data: dict = None,
         headers: dict = None,
         json: dict = None,
+        *,
+        endpoint: str,
     ) -> dict | bytes:
-        async with self.semaphore:
-            return await self.http_client.make_request(
+        async with self.limiters[endpoint].acquire():
+            return await self._request_with_token(
                 url=url,
                 method=method,
                 headers=headers,
@@ -123,144 +182,110 @@ class SaluteSpeechHandler(Handler):
                 json=json,
             )
 
+    async def _request_with_token(self, **kwargs: Any) -> dict | bytes:
+        try:
+            return await self.http_client.make_request(**kwargs)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 401:
+                # Retries of the caller pick up a fresh token
+                self.tokens.invalidate()
+            raise
+
     async def start(self) -> None:
-        await self.http_client.start()
-        await self._get_access_token()
-        self._is_running = True
+        self.poller.start()
+        # Keeps retrying in the background if the first refresh fails
+        self.tokens.start()
+        await self.tokens.refresh()
 
     async def stop(self) -> None:
-        self._is_running = False
-
-        if self._connector:
-            await self._connector.close()
+        self.tokens.stop()
+        await self.poller.stop()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "outstanding": self.outstanding,
+            "assigned": self.assigned,
+            "limits": {
+                endpoint: limiter.stats() for endpoint, limiter in self.limiters.items()
+            },
+            "poller": self.poller.stats(),
+            "tokens": self.tokens.stats(),
+            "retry": self.retry.stats(),
+        }
 
-    async def suspended_task(task: Coroutine, timeout: int):
-        await asyncio.sleep(timeout)
-        asyncio.create_task(task, name=task.__name__)
-
-    async def callback_get_access_token(self, timestamp_ms):
-        dt = datetime.datetime.fromtimestamp(timestamp_ms / 1000)  # UTC время
-        logger.info(f"Token will be expired in {dt.strftime('%Y-%m-%d %H:%M:%S')}")
-        now = datetime.datetime.now()
-        two_minutes = datetime.timedelta(minutes=2.0)
-        time_to_sleep = 0
-        if now < dt:
-            time_to_sleep = (dt - now - two_minutes).seconds
-
-        await asyncio.sleep(time_to_sleep)
-        logger.info("Token has been expired")
-        logger.info("Start updating token")
-        try:
-            await self._get_access_token()
-        except aiohttp.ClientConnectorError as _ex:
-            logger.error(f"Got client error {_ex}", exc_info=True)
-            asyncio.create_task(self.suspended_task(self._access_token(), 30))
-        except TimeoutError as _ex:
-            logger.error(f"Got {_ex}", exc_info=True)
-            asyncio.create_task(self.suspended_task(self._access_token(), 30))
-        except Exception as _ex:
-            logger.error(f"Got another error {_ex}", exc_info=True)
-            asyncio.create_task(self.suspended_task(self._access_token(), 30))
-
-        logger.info("Token has been updated")
-
-    @backoff.on_exception(
-        backoff.expo,
-        (
-            TimeoutError,
-            aiohttp_client_exp.ConnectionTimeoutError,
-            aiohttp.ClientConnectorError,
-            aiohttp_client_exp.ClientConnectionError,
-            aiohttp.ClientResponseError,
-            aiohttp.ServerTimeoutError,
-            asyncio.TimeoutError,
-            RuntimeError,
-        ),
-        max_tries=5,
-        max_time=30,
-        jitter=backoff.full_jitter,
-    )
-    async def _get_access_token(self):
+    async def _fetch_access_token(self) -> tuple[str, float]:
         headers = {
             "RqUID": f"{uuid.uuid4()}",
             "Content-Type": "application/x-www-form-urlencoded",
-            "Authorization": f"Bearer {self.credentials}",
+            "Authorization": f"Bearer {self.config.credentials}",
         }
         data = {"scope": self.config.scope}
         data = await self.make_request(
-            HTTPMethods.POST, self.url_access_token, headers=headers, data=data
+            HTTPMethods.POST,
+            self.config.url_access_token,
+            headers=headers,
+            data=data,
+            endpoint="token",
         )
+        # expires_at is in milliseconds
+        return f"Bearer {data['access_token']}", data["expires_at"] / 1000
 
-        access_token, exp = data["access_token"], data["expires_at"]
-        await self.set_access_token(f"Bearer {access_token}")
-
-        asyncio.create_task(
-            self.callback_get_access_token(exp),
-            name=self.callback_get_access_token.__name__,
-        )
+    @retrying("upload")
+    async def handle_upload(
+        self,
+        file: Audio | Callable[[], AsyncIterable[bytes]],
+        size: Optional[int] = None,
+    ) -> str:
+        """
+        Upload audio as a streamed multipart form.
 
-    @backoff.on_exception(
-        backoff.expo,
-        (
-            TimeoutError,
-            aiohttp_client_exp.ConnectionTimeoutError,
-            aiohttp.ClientConnectorError,
-            aiohttp_client_exp.ClientConnectionError,
-            aiohttp.ClientResponseError,
-            aiohttp.ServerTimeoutError,
-            asyncio.TimeoutError,
-            RuntimeError,
-        ),
-        max_tries=5,
-        max_time=30,
-        jitter=backoff.full_jitter,
-    )
-    async def handle_upload(self, file: Audio) -> str:
-        url = f"{self.url_rest}/data:upload"
-        form = aiohttp.FormData()
-        form.add_field(
+        `file` is an `Audio`, read from memory or its temp file, or a
+        factory of async chunk iterators, e.g. starting an encoder, called
+        on every attempt; `size` is the length of the stream if known.
+        """
+        url = f"{self.config.url_rest}/data:upload"
+        if isinstance(file, Audio):
+            source, filename, size = file.file, str(file), len(file.file)
+        else:
+            source, filename = file, "audio"
+        form = multipart_upload(
+            source,
             name="audio_file1",
-            value=file.file,
-            filename=str(file),
-            content_type="application/octet-stream",
+            filename=filename,
+            size=size,
+            chunk_size=self.upload_chunk_size,
         )
         logger.info(f"Request URL: {url}")
-        logger.info(f"Payload size: {len(file.file)} bytes")
-        logger.info(f"Payload: {form}")
+        logger.info(f"Payload size: {size} bytes")
         headers = {
             "Authorization": await self.get_access_token() or "",
         }
 
         data = await self.make_request(
-            method=HTTPMethods.POST, url=url, headers=headers, data=form
+            method=HTTPMethods.POST,
+            url=url,
+            headers=headers,
+            data=form,
+            endpoint="upload",
         )
 
         return data["result"]["request_file_id"]
 
-    @backoff.on_exception(
-        backoff.expo,
-        (
-            TimeoutError,
-            aiohttp_client_exp.ConnectionTimeoutError,
-            aiohttp.ClientConnectorError,
-            aiohttp_client_exp.ClientConnectionError,
-            aiohttp.ClientResponseError,
-            aiohttp.ServerTimeoutError,
-            asyncio.TimeoutError,
-            RuntimeError,
-        ),
-        max_tries=5,
-        max_time=30,
-        jitter=backoff.full_jitter,
-    )
-    async def handle_recognize(self, file_id: str, codec: AudioFormat) -> str:
-        url = f"{self.url_rest}/speech:async_recognize"
+    @retrying("recognize")
+    async def handle_recognize(
+        self,
+        file_id: str,
+        codec: AudioFormat,
+        sample_rate: int = 16000,
+        channels_count: int = 1,
+    ) -> str:
+        url = f"{self.config.url_rest}/speech:async_recognize"
         payload = {
             "options": {
                 "model": "general",
                 "audio_encoding": codec,
-                "sample_rate": 16000,
-                "channels_count": 1,
+                "sample_rate": sample_rate,
+                "channels_count": channels_count,
             },
             "request_file_id": file_id,
         }
@@ -270,43 +295,177 @@ class SaluteSpeechHandler(Handler):
         }
 
         data = await self.make_request(
-            method=HTTPMethods.POST, url=url, headers=headers, json=payload
+            method=HTTPMethods.POST,
+            url=url,
+            headers=headers,
+            json=payload,
+            endpoint="recognize",
         )
         return data["result"]["id"]
 
-    @backoff.on_exception(
-        backoff.expo,
-        (
-            TimeoutError,
-            aiohttp_client_exp.ConnectionTimeoutError,
-            aiohttp.ClientConnectorError,
-            aiohttp_client_exp.ClientConnectionError,
-            aiohttp.ClientResponseError,
-            aiohttp.ServerTimeoutError,
-            asyncio.TimeoutError,
-            RuntimeError,
-        ),
-        max_tries=5,
-        max_time=30,
-        jitter=backoff.full_jitter,
-    )
+    # The poller reschedules failed checks itself
+    @retrying("status", max_tries=1)
     async def handle_status(self, task_id: str) -> tuple[TaskStatus, str]:
-        url = f"{self.url_rest}/task:get?id={task_id}"
+        url = f"{self.config.url_rest}/task:get?id={task_id}"
 
         # type: ignore
         headers = {"Authorization": await self.get_access_token()}
 
-        data = await self.make_request(HTTPMethods.GET, url, headers=headers)
+        data = await self.make_request(
+            method=HTTPMethods.GET, url=url, headers=headers, endpoint="status"
+        )
         status = TaskStatus(data["result"]["status"])
         response_id = data["result"].get("response_file_id", "")
         return status, response_id
 
+    @retrying("download")
     async def handle_download(self, file_id: str) -> bytes:
-        url = f"{self.url_rest}/data:download?response_file_id={file_id}"
+        url = f"{self.config.url_rest}/data:download?response_file_id={file_id}"
 
         headers = {"Authorization": await self.get_access_token() or ""}
 
-        return await self.make_request(HTTPMethods.GET, url, headers=headers)
+        return await self.make_request(
+            HTTPMethods.GET, url, headers=headers, endpoint="download"
+        )
+
+
+class SaluteSpeechHandler(Handler):
+    """
+    Salute Speech recognition over a pool of accounts.
+
+    Every recording or chunk goes to the available account with the least
+    outstanding audio. With `hedge_factor` set, a task still running
+    `hedge_factor` times longer than expected (at least
+    `hedge_min_delay`) is recognized again on another account and the
+    first result wins.
+    """
+
+    class Config(SaluteSpeechConfig):
+        name: str = Field(default="SaluteSpeechASR")
+
+    def __init__(self, *args, journal: Optional[JobJournal] = None, **kwargs) -> None:
+        self.journal = journal
+        self.started = asyncio.Event()
+        self._is_running = False
+        self.config = self.Config(*args, **kwargs)
+        self.ssl_default_context = ssl.create_default_context(cadata=certifi.contents())
+        self._connector = None
+        self.timeout = aiohttp.ClientTimeout(total=30, connect=10)
+        resolver = aiohttp.AsyncResolver()
+        self._connector = aiohttp.TCPConnector(
+            resolver=resolver,
+            ssl_context=self.ssl_default_context,
+            keepalive_timeout=15,
+            limit=None,
+            limit_per_host=0,
+            enable_cleanup_closed=True,
+        )
+        self.http_client = BaseHTTPClient(self._connector)
+        self.accounts = [
+            SaluteAccount(
+                account,
+                self.http_client,
+                self.config.simultaneous_requests,
+                self.config.upload_chunk_size,
+                *args,
+                **kwargs,
+            )
+            for account in self.config.account_configs()
+        ]
+        self.batcher = ChannelBatcher(self.recognize, *args, **kwargs)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def credentials(self) -> str:
+        return self.accounts[0].config.credentials
+
+    @property
+    def scope(self) -> str:
+        return self.accounts[0].config.scope
+
+    @property
+    def url_access_token(self) -> str:
+        return self.accounts[0].config.url_access_token
+
+    @property
+    def url_rest(self) -> str:
+        return self.accounts[0].config.url_rest
+
+    @property
+    def check_interval(self) -> float:
+        return self.config.check_interval
+
+    def account(self, name: Optional[str]) -> Optional[SaluteAccount]:
+        """Account by name, the first one for jobs journaled without it"""
+        if name is None:
+            return self.accounts[0]
+        for account in self.accounts:
+            if account.name == name:
+                return account
+        return None
+
+    def pick_account(self, exclude: Optional[SaluteAccount] = None) -> SaluteAccount:
+        """The available account with the least outstanding audio"""
+        candidates = [account for account in self.accounts if account is not exclude]
+        available = [account for account in candidates if account.available]
+        return min(
+            available or candidates,
+            key=lambda account: (account.outstanding, account.assigned),
+        )
+
+    def hedge_delay(self, account: SaluteAccount, duration: Optional[float]) -> float:
+        expected = account.poller.first_delay(duration)
+        return max(self.config.hedge_min_delay, self.config.hedge_factor * expected)
+
+    async def _handle(
+        self,
+        action: str,
+        *args: Any,
+        account: Optional[SaluteAccount] = None,
+        **kwargs: Any,
+    ) -> Any:
+        if not self._is_running:
+            raise RuntimeError("Handler not started")
+
+        handler = getattr(account or self, f"handle_{action}", None)
+        if not handler:
+            raise ValueError(f"Unknown action: {action}")
+
+        return await handler(*args, **kwargs)
+
+    async def start(self) -> None:
+        await self.http_client.start()
+        results = await asyncio.gather(
+            *(account.start() for account in self.accounts), return_exceptions=True
+        )
+        for account, result in zip(self.accounts, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Salute account {account.name} failed to start: {result}")
+        # Token managers keep retrying in the background and requests wait
+        # on them, so an unreachable Salute at boot must not stall the handler
+        if all(isinstance(result, BaseException) for result in results):
+            logger.error("No Salute account has a token yet, retrying in background")
+        self._is_running = True
+        self.started.set()
+
+    async def stop(self) -> None:
+        self._is_running = False
+        self.started.clear()
+        self.batcher.stop()
+        for account in self.accounts:
+            await account.stop()
+
+        if self._connector:
+            await self._connector.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "accounts": {account.name: account.stats() for account in self.accounts},
+            "batcher": self.batcher.stats(),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
 
     async def handle_codec(self, file: Audio) -> str:
         """
@@ -317,49 +476,248 @@ class SaluteSpeechHandler(Handler):
             raise ValueError(f"Unsupported audio format: {file}")
         return codec
 
-    async def handle(self, file: Audio) -> list[TranscriptionItem] | None:
+    async def handle(
+        self, file: Audio, job_id: Optional[str] = None
+    ) -> list[LazyTranscriptionItem] | None:
+        """
+        Recognize audio, long recordings as parallel chunks.
+
+        Chunks are cut at silences, spread over the accounts and merged in
+        order with timestamps shifted by each chunk's offset. With a
+        `job_id` every upload and task is recorded in the journal so the
+        job survives a restart. Short recordings without a `job_id` may be
+        batched with other jobs instead, a packed task is not journaled.
+        """
+        if not job_id and self.batcher.accepts(file):
+            return await self.batcher.submit(file)
+
+        if (
+            not self.config.chunk_duration
+            or not file.duration
+            or file.duration < self.config.chunk_min_duration
+        ):
+            if self.journal and job_id:
+                self.journal.set_chunks(job_id, 1)
+            return await self.recognize(file, job_id)
+
+        chunks = await asyncio.to_thread(
+            split_audio, file, self.config.chunk_duration, self.config.chunk_search
+        )
+        logger.info(f"Audio split into {len(chunks)} chunks")
+        if self.journal and job_id:
+            self.journal.set_chunks(job_id, len(chunks))
+        try:
+            results = await asyncio.gather(
+                *(
+                    self.recognize(chunk, job_id, index, offset)
+                    for index, (offset, chunk) in enumerate(chunks)
+                )
+            )
+        finally:
+            for _, chunk in chunks:
+                chunk.close()
+
+        if any(result is None for result in results):
+            logger.error("Some chunks were not recognized")
+            return None
+        return merge_chunks(
+            [(offset, items) for (offset, _), items in zip(chunks, results)]
+        )
+
+    async def recognize(
+        self,
+        file: Audio,
+        job_id: Optional[str] = None,
+        index: int = 0,
+        offset: float = 0.0,
+    ) -> list[LazyTranscriptionItem] | None:
+        """
+        Recognize one file on the least loaded account, hedging on a
+        second one if it takes too long.
+
+        Only the first attempt is journaled, a restart resumes it.
+        """
+        account = self.pick_account()
+        primary = self._submit(account, file, job_id, index, offset)
+        if not self.config.hedge_factor or len(self.accounts) < 2:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(
+                pending, timeout=self.hedge_delay(account, file.duration)
+            )
+            if not done:
+                backup = self.pick_account(exclude=account)
+                logger.warning(
+                    f"Chunk {index} is slow on {account.name}, hedging on {backup.name}"
+                )
+                self.hedges += 1
+                pending.add(self._submit(backup, file, None, index, offset))
+            while done or pending:
+                for task in done:
+                    if (result := task.result()) is not None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return result
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _submit(
+        self,
+        account: SaluteAccount,
+        file: Audio,
+        job_id: Optional[str],
+        index: int,
+        offset: float,
+    ) -> asyncio.Task:
+        # Reserved right away, so chunks routed together spread out
+        seconds = file.duration or 1.0
+        account.reserve(seconds)
+        task = asyncio.create_task(
+            self._recognize_on(account, file, job_id, index, offset)
+        )
+        task.add_done_callback(lambda _: account.release(seconds))
+        return task
+
+    async def _recognize_on(
+        self,
+        account: SaluteAccount,
+        file: Audio,
+        job_id: Optional[str],
+        index: int,
+        offset: float,
+    ) -> list[LazyTranscriptionItem] | None:
         result = None
         try:
             # self.handel_codec(file_path)
             # 1. Загрузка файла
-            file_id = await self._handle("upload", file)
-            logger.info(f"Файл загружен: {file_id}")
+            file_id = await self._handle("upload", file, account=account)
+            logger.info(f"Файл загружен: {file_id} ({account.name})")
 
             codec = await self._handle("codec", file)
             logger.info(f"Кодек: {codec}")
+            if self.journal and job_id:
+                self.journal.record_upload(
+                    job_id,
+                    index,
+                    offset,
+                    file_id,
+                    codec,
+                    file.sample_rate,
+                    file.channels_count,
+                    file.duration,
+                    account.name,
+                )
             # 2. Запуск распознавания
-            task_id = await self._handle("recognize", file_id, codec)
+            task_id = await self._handle(
+                "recognize",
+                file_id,
+                codec,
+                file.sample_rate,
+                file.channels_count,
+                account=account,
+            )
             logger.info(f"Задача создана: {task_id}")
+            if self.journal and job_id:
+                self.journal.record_task(job_id, index, task_id)
 
             # 3. Отслеживание статуса
-            while True:
-                await asyncio.sleep(self.check_interval)
-                status, response_id = await self._handle("status", task_id)
-
-                match status:
-                    case TaskStatus.NEW:
-                        logger.info("Задача создана")
-                    case TaskStatus.RUNNING:
-                        logger.info("Задача в обработке")
-                    case TaskStatus.CANCELED:
-                        logger.info("Задача отменена")
-                        break
-                    case TaskStatus.ERROR:
-                        error = (await self._handle("status", task_id))[1]
-                        logger.error(f"Ошибка задачи: {error}", exc_info=True)
-                        break
-                    case TaskStatus.DONE:
-                        logger.info(f"Задача завершена: {response_id}")
-
-                        # 4. Загрузка результатов
-                        output = await self._handle("download", response_id)
-                        result = [
-                            TranscriptionItem(**item) for item in json.loads(output)
-                        ]
-                        break
+            result = await self.collect(task_id, file.duration, account)
 
         except aiohttp.ClientError as e:
             logger.error(f"Ошибка соединения: {str(e)}", exc_info=True)
         except Exception as e:
             logger.error(f"Ошибка: {str(e)}", exc_info=True)
         return result
+
+    async def collect(
+        self,
+        task_id: str,
+        duration: Optional[float] = None,
+        account: Optional[SaluteAccount] = None,
+    ) -> list[LazyTranscriptionItem] | None:
+        """Wait for a recognition task and download its result"""
+        account = account or self.accounts[0]
+        status, response_id = await account.poller.wait(task_id, duration)
+        match status:
+            case TaskStatus.CANCELED:
+                logger.info("Задача отменена")
+            case TaskStatus.ERROR:
+                logger.error(f"Ошибка задачи: {task_id}")
+            case TaskStatus.DONE:
+                logger.info(f"Задача завершена: {response_id}")
+
+                # 4. Загрузка результатов
+                output = await self._handle("download", response_id, account=account)
+                return parse_transcription(output)
+        return None
+
+    async def resume(self, job: JournalJob) -> list[LazyTranscriptionItem] | None:
+        """
+        Finish a journaled job after a restart.
+
+        Submitted tasks are polled again, chunks that were only uploaded are
+        submitted to recognition from their upload id, on the account that
+        holds it.
+        """
+        await self.started.wait()
+
+        async def resume_task(task: JournalTask) -> list[LazyTranscriptionItem] | None:
+            account = self.account(task.account)
+            if account is None:
+                logger.error(f"Salute account {task.account} is not configured")
+                return None
+            seconds = task.duration or 1.0
+            account.reserve(seconds)
+            try:
+                task_id = task.task_id
+                if task_id is None:
+                    task_id = await self._handle(
+                        "recognize",
+                        task.upload_id,
+                        task.codec,
+                        task.sample_rate,
+                        task.channels_count,
+                        account=account,
+                    )
+                    self.journal.record_task(job.id, task.index, task_id)
+                return await self.collect(task_id, task.duration, account)
+            except Exception as e:
+                logger.error(f"Ошибка: {str(e)}", exc_info=True)
+                return None
+            finally:
+                account.release(seconds)
+
+        results = await asyncio.gather(*(resume_task(task) for task in job.tasks))
+        if any(result is None for result in results):
+            return None
+        return merge_chunks(
+            [(task.offset, items) for task, items in zip(job.tasks, results)]
+        )
+
+
+def is_retryable_salute(error: BaseException) -> bool:
+    """Also retry 401, the token is dropped on it and fetched again"""
+    if isinstance(error, aiohttp.ClientResponseError) and error.status == 401:
+        return True
+    return is_retryable(error)
+
+
+def merge_chunks(
+    chunks: list[tuple[float, list[LazyTranscriptionItem]]],
+) -> list[LazyTranscriptionItem]:
+    """Join chunk results in order, shifting timestamps by chunk offsets"""
+    merged = []
+    for offset, items in chunks:
+        # Remaps are applied lazily, so the offset is bound now
+        shift = functools.partial(operator.add, offset)
+        merged.extend(item.remap(shift) for item in items)
+    return merged
@@ -1,8 +1,20 @@
-from typing import List, Union
+import asyncio
+import bisect
+import json
+from typing import Callable, List, Optional
 from enum import Enum
 from io import BytesIO
 
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PrivateAttr,
+    field_validator,
+    model_validator,
+)
+
+from src.buffer import AudioBuffer
 
 
 class WordAlignment(BaseModel):
@@ -64,29 +76,237 @@ class TranscriptionItem(BaseModel):
     insight: str
     person_identity: PersonIdentity
 
+    def remap(self, mapping: Callable[[float], float]) -> "TranscriptionItem":
+        """Return a copy with every timestamp passed through `mapping`"""
+
+        def convert(value: str) -> str:
+            return format_seconds(mapping(parse_seconds(value)))
+
+        results = [
+            result.model_copy(
+                update={
+                    "start": convert(result.start),
+                    "end": convert(result.end),
+                    "word_alignments": [
+                        word.model_copy(
+                            update={
+                                "start": convert(word.start),
+                                "end": convert(word.end),
+                            }
+                        )
+                        for word in result.word_alignments
+                    ],
+                }
+            )
+            for result in self.results
+        ]
+        return self.model_copy(
+            update={
+                "results": results,
+                "processed_audio_start": convert(self.processed_audio_start),
+                "processed_audio_end": convert(self.processed_audio_end),
+            }
+        )
+
+
+class LazyTranscriptionItem:
+    """
+    Utterance of an STT result parsed on demand.
+
+    `text`, `start` and `end` are read straight from the raw payload.
+    The validated `TranscriptionItem` is built on first access to `item`
+    or `results`; remaps are composed and applied to it then.
+    """
+
+    __slots__ = ("raw", "_mapping", "_item")
+
+    def __init__(
+        self, raw: dict, mapping: Optional[Callable[[float], float]] = None
+    ) -> None:
+        self.raw = raw
+        self._mapping = mapping
+        self._item: Optional[TranscriptionItem] = None
+
+    @property
+    def text(self) -> str:
+        return " ".join(result["text"] for result in self.raw["results"])
+
+    @property
+    def channel(self) -> int:
+        return self.raw.get("channel", 0)
+
+    @property
+    def start(self) -> float:
+        return self._map(parse_seconds(self.raw["processed_audio_start"]))
+
+    @property
+    def end(self) -> float:
+        return self._map(parse_seconds(self.raw["processed_audio_end"]))
+
+    @property
+    def item(self) -> TranscriptionItem:
+        if self._item is None:
+            item = TranscriptionItem.model_validate(self.raw)
+            self._item = item.remap(self._mapping) if self._mapping else item
+        return self._item
+
+    @property
+    def results(self) -> List[Result]:
+        return self.item.results
+
+    def remap(self, mapping: Callable[[float], float]) -> "LazyTranscriptionItem":
+        """Return a copy with every timestamp passed through `mapping`"""
+        if self._mapping is not None:
+            previous = self._mapping
+            return LazyTranscriptionItem(
+                self.raw, lambda seconds: mapping(previous(seconds))
+            )
+        return LazyTranscriptionItem(self.raw, mapping)
+
+    def dump(self) -> dict:
+        """Raw payload with the remaps applied, without building the model"""
+        if self._mapping is None:
+            return self.raw
+
+        def convert(timed: dict) -> dict:
+            return {
+                **timed,
+                "start": format_seconds(self._map(parse_seconds(timed["start"]))),
+                "end": format_seconds(self._map(parse_seconds(timed["end"]))),
+            }
+
+        return {
+            **self.raw,
+            "processed_audio_start": format_seconds(self.start),
+            "processed_audio_end": format_seconds(self.end),
+            "results": [
+                {
+                    **convert(result),
+                    "word_alignments": [
+                        convert(word) for word in result.get("word_alignments", [])
+                    ],
+                }
+                for result in self.raw["results"]
+            ],
+        }
+
+    def _map(self, seconds: float) -> float:
+        return self._mapping(seconds) if self._mapping else seconds
+
+    def __repr__(self) -> str:
+        return (
+            f"LazyTranscriptionItem(start={self.start:.3f}, end={self.end:.3f}, "
+            f"text={self.text!r})"
+        )
+
+
+def parse_transcription(payload: bytes | str) -> list[LazyTranscriptionItem]:
+    """Parse a Salute result file without validating it"""
+    return [LazyTranscriptionItem(raw) for raw in json.loads(payload)]
+
+
+def parse_seconds(value: str) -> float:
+    """Parse a Salute duration like '3.920s'"""
+    return float(value.rstrip("s") or 0)
+
+
+def format_seconds(value: float) -> str:
+    return f"{value:.3f}s"
+
+
+class OffsetMap(BaseModel):
+    """
+    Maps timestamps of trimmed audio back to the original recording.
+
+    Each segment is (processed_start, original_start, length) in seconds,
+    ordered by processed_start.
+    """
+
+    segments: list[tuple[float, float, float]]
+    # Processed starts for the bisect, built once per map
+    _starts: list[float] = PrivateAttr(default_factory=list)
+
+    @model_validator(mode="after")
+    def index_segments(self) -> "OffsetMap":
+        self._starts = [segment[0] for segment in self.segments]
+        return self
+
+    def to_original(self, seconds: float) -> float:
+        if not self.segments:
+            return seconds
+        index = max(bisect.bisect_right(self._starts, seconds) - 1, 0)
+        processed_start, original_start, length = self.segments[index]
+        return original_start + min(seconds - processed_start, length)
+
+    def then(self, outer: "OffsetMap") -> "OffsetMap":
+        """
+        Map that applies this one and `outer` after it, e.g. a VAD trim of
+        audio that already had its own map. Parts of segments that fall
+        into gaps of `outer` are dropped.
+        """
+        segments = []
+        for processed_start, original_start, length in self.segments:
+            end = original_start + length
+            for outer_start, outer_original, outer_length in outer.segments:
+                low = max(original_start, outer_start)
+                high = min(end, outer_start + outer_length)
+                if high > low:
+                    segments.append(
+                        (
+                            processed_start + low - original_start,
+                            outer_original + low - outer_start,
+                            high - low,
+                        )
+                    )
+        return OffsetMap(segments=segments)
+
 
 class Audio(BaseModel):
     """
     Audio data class for single file.
+
+    Bytes-like inputs are wrapped, not copied.
     """
 
-    file: bytes
+    file: AudioBuffer
     format: str
+    sample_rate: int = 16000
+    channels_count: int = 1
+    offset_map: Optional[OffsetMap] = None
+    trimmed_seconds: float = 0.0
+    duration: Optional[float] = None
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    def _truncate_data(self, data: bytes) -> str:
+    @field_validator("file", mode="before")
+    def validate_file(cls, v):
+        if isinstance(v, AudioBuffer):
+            return v
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            return AudioBuffer.wrap(v)
+        raise ValueError("File must be a bytes-like object or AudioBuffer")
+
+    def _truncate_data(self, data: AudioBuffer) -> str:
         """Сокращает отображение байтов для печати"""
         MAX_PREVIEW = 10  # Первые N байт для предпросмотра
 
-        preview = data[:MAX_PREVIEW].hex(" ", 1)
+        if data.closed:
+            return f"{data!r}, closed"
+        preview = data.head(MAX_PREVIEW).hex(" ", 1)
         if len(data) > MAX_PREVIEW:
             preview += "..."
-        return f"bytes(length={len(data)}, data={preview})"
+        return f"{data!r}, data={preview}"
+
+    def close(self) -> None:
+        """Release the payload, removes its temp file if it was spilled"""
+        self.file.close()
 
     def __repr__(self) -> str:
         truncated = self._truncate_data(self.file)
-        return f"Audio(file={truncated}, format='{self.format}')"
+        return (
+            f"Audio(file={truncated}, format='{self.format}', "
+            f"sample_rate={self.sample_rate}, channels_count={self.channels_count})"
+        )
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -98,40 +318,40 @@ class Audio(BaseModel):
 class Audios(BaseModel):
     """
     Audio data class for multiple files.
+
+    Bytes-like inputs are wrapped, not copied.
     """
 
-    files: list[Union[bytes, BytesIO]]
-    format: str
+    files: list[AudioBuffer]
+    format: Optional[str]
+    duration: Optional[float] = None
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    @field_validator("files")
+    @field_validator("files", mode="before")
     def validate_files(cls, v):
         validated = []
         for item in v:
-            if isinstance(item, bytes):
-                validated.append(BytesIO(item))
-            elif isinstance(item, BytesIO):
+            if isinstance(item, AudioBuffer):
                 validated.append(item)
+            elif isinstance(item, (bytes, bytearray, memoryview)):
+                validated.append(AudioBuffer.wrap(item))
+            elif isinstance(item, BytesIO):
+                validated.append(AudioBuffer.wrap(item.getbuffer()))
             else:
-                raise ValueError("File must be bytes or BytesIO")
+                raise ValueError("File must be a bytes-like object or AudioBuffer")
         return validated
 
-    def _truncate_data(self, data: Union[bytes, BytesIO]) -> str:
-        """Сокращает отображение байтов/BytesIO для печати"""
+    def _truncate_data(self, data: AudioBuffer) -> str:
+        """Сокращает отображение байтов для печати"""
         MAX_PREVIEW = 10  # Первые N байт для предпросмотра
 
-        if isinstance(data, BytesIO):
-            raw = data.getvalue()
-            preview = raw[:MAX_PREVIEW].hex(" ", 1) + (
-                "..." if len(raw) > MAX_PREVIEW else ""
-            )
-            return f"BytesIO(length={len(raw)})"
-
-        preview = data[:MAX_PREVIEW].hex(" ", 1) + (
+        if data.closed:
+            return f"{data!r}, closed"
+        preview = data.head(MAX_PREVIEW).hex(" ", 1) + (
             "..." if len(data) > MAX_PREVIEW else ""
         )
-        return f"bytes(length={len(data)}, data={preview})"
+        return f"{data!r}, data={preview}"
 
     def __repr__(self) -> str:
         MAX_ITEMS = 3  # Максимум элементов для показа
@@ -145,3 +365,32 @@ class Audios(BaseModel):
 
     def __len__(self) -> int:
         return len(self.files)
+
+    def close(self) -> None:
+        """Release all payloads"""
+        for file in self.files:
+            file.close()
+
+
+class StoredAudio(BaseModel):
+    """
+    Audio received from a user and waiting for a mode to be selected.
+
+    Duration is reported by Telegram, or probed from the headers before
+    any download when it is missing.
+    In eager mode `task` is the transcription started on receipt. Files
+    with a cached transcript are not probed, their `url` is resolved from
+    `file_id` only if the cache entry is gone by the time it is needed.
+    """
+
+    url: Optional[str] = None
+    file_id: Optional[str] = None
+    file_unique_id: Optional[str] = None
+    duration: Optional[float] = None
+    task: Optional[asyncio.Task] = Field(default=None, exclude=True)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
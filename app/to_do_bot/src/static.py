@@ -133,3 +133,16 @@ done_deals = """Ты — внимательный и лаконичный асс
 
 Теперь проанализируй текст:
 """
+
+chunk_prompt = """Ты — внимательный и лаконичный ассистент. На входе у тебя — фрагмент длинного текста STT, остальные фрагменты обрабатываются отдельно.
+
+Твоя задача:
+1. Исправь ошибки и артефакты транскрипции.
+2. Перескажи фрагмент кратко, сохранив все задачи, выполненные дела, ключевые мысли, проблемы, имена, даты и числа.
+3. Сохраняй формулировки и время глаголов (сделано или нужно сделать), причинно-следственные связи и эмоциональную окраску.
+4. Не добавляй выводов, оценок и информации, которой нет в тексте.
+
+Вывод — простой текст без разметки, по одной мысли на строку.
+
+Фрагмент:
+"""
@@ -1,6 +1,6 @@
 import abc
 import asyncio
-from typing import Any
+from typing import Any, Callable
 
 
 class AbstractStore(metaclass=abc.ABCMeta):
@@ -76,6 +76,22 @@ class AsyncInMemoryStore(AbstractStore):
 
             self.store[key].append(value)
 
+    async def put_if(
+        self, key, value, predicate: Callable[[list[Any]], bool]
+    ) -> list[Any] | None:
+        """
+        Append the value if `predicate` holds for the values already stored.
+
+        Check and append happen under the lock. Returns the values the
+        check saw, or None if the value was not added.
+        """
+        async with self._lock:
+            values = self.store.get(key, [])
+            if not predicate(values):
+                return None
+            self.store[key] = [*values, value]
+            return values
+
     async def get(self, key) -> list[Any] | None:
         async with self._lock:
             return self.store.get(key)
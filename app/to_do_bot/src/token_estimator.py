@@ -0,0 +1,76 @@
+import math
+import re
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Words and single punctuation marks, the pieces a BPE tokenizer splits on
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenEstimatorConfig(BaseSettings):
+    chars_per_token: float = Field(3.0, alias="LLM_CHARS_PER_TOKEN")
+    smoothing: float = Field(0.2, alias="LLM_TOKENS_SMOOTHING")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class TokenEstimator:
+    """
+    Local estimate of GigaChat token counts, without a request to the API.
+
+    Words are counted as `chars_per_token` characters a token and every
+    punctuation mark as a token. The result is scaled by a factor moved
+    towards the ratio of every exact count reported back by `calibrate`.
+    System prompts are counted once per topic, an exact count replaces
+    the estimate when one is known.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = TokenEstimatorConfig(*args, **kwargs)
+        self.scale = 1.0
+        self.calibrations = 0
+        # Topic to (tokens, exact), estimates are kept unscaled
+        self._prompts: dict[str, tuple[float, bool]] = {}
+
+    def estimate(self, text: str) -> int:
+        return math.ceil(self._raw(text) * self.scale)
+
+    def prompt(self, topic: str, text: str) -> int:
+        """Tokens of the system prompt of a topic, counted once"""
+        if topic not in self._prompts:
+            self._prompts[topic] = (self._raw(text), False)
+        tokens, exact = self._prompts[topic]
+        return int(tokens) if exact else math.ceil(tokens * self.scale)
+
+    def is_exact(self, topic: str) -> bool:
+        return self._prompts.get(topic, (0, False))[1]
+
+    def set_prompt(self, topic: str, text: str, tokens: int) -> None:
+        """Keep an exact count of a system prompt"""
+        self._prompts[topic] = (tokens, True)
+        self.calibrate(text, tokens)
+
+    def calibrate(self, text: str, tokens: int) -> None:
+        raw = self._raw(text)
+        if raw <= 0 or tokens <= 0:
+            return
+        alpha = self.config.smoothing if self.calibrations else 1.0
+        self.scale += alpha * (tokens / raw - self.scale)
+        self.calibrations += 1
+
+    def _raw(self, text: str) -> float:
+        tokens = 0.0
+        for piece in _PIECES.findall(text):
+            if piece[0].isalnum() or piece[0] == "_":
+                tokens += max(1.0, len(piece) / self.config.chars_per_token)
+            else:
+                tokens += 1.0
+        return tokens
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "scale": self.scale,
+            "calibrations": self.calibrations,
+            "prompts": len(self._prompts),
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+# Returns the token and its expiry as a unix timestamp in seconds
+TokenFetch = Callable[[], Awaitable[tuple[str, float]]]
+
+
+class TokenManagerConfig(BaseSettings):
+    refresh_margin: float = Field(120.0, alias="TOKEN_REFRESH_MARGIN")
+    refresh_jitter: float = Field(30.0, alias="TOKEN_REFRESH_JITTER")
+    retry_delays: list[float] = Field([1, 2, 5, 10, 30], alias="TOKEN_RETRY_DELAYS")
+    expiry_safety: float = Field(5.0, alias="TOKEN_EXPIRY_SAFETY")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class TokenManager:
+    """
+    Keeps an access token fresh for one set of credentials.
+
+    The token is refreshed in the background `refresh_margin` (minus a
+    random jitter) before it expires. Concurrent callers of `get` and
+    `refresh` share one in-flight request. A failed fetch is retried
+    after each of `retry_delays`, and the current token is served while
+    it is still valid.
+    """
+
+    def __init__(self, fetch: TokenFetch, name: str, *args, **kwargs) -> None:
+        self.config = TokenManagerConfig(*args, **kwargs)
+        self.name = name
+        self._fetch = fetch
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._obtained_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+
+    @property
+    def valid(self) -> bool:
+        return (
+            self._token is not None
+            and time.time() < self._expires_at - self.config.expiry_safety
+        )
+
+    @property
+    def token_age(self) -> Optional[float]:
+        """Seconds since the current token was obtained"""
+        if self._obtained_at is None:
+            return None
+        return time.time() - self._obtained_at
+
+    @property
+    def expires_in(self) -> float:
+        return self._expires_at - time.time()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(
+                self._run(), name=f"{self.name}_token_refresh"
+            )
+
+    def stop(self) -> None:
+        for task in (self._task, self._refreshing):
+            if task is not None:
+                task.cancel()
+        self._task = self._refreshing = None
+
+    async def get(self) -> str:
+        """Current token, waiting for a refresh only when it is unusable"""
+        if self.valid:
+            return self._token
+        return await self.refresh()
+
+    def invalidate(self) -> None:
+        """Drop the token, e.g. after the API answered 401"""
+        self._expires_at = 0.0
+
+    async def refresh(self) -> str:
+        """Fetch a new token or join the fetch already in flight"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh_with_retries())
+        # A cancelled caller must not cancel the refresh others are waiting on
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh_with_retries(self) -> str:
+        delays = [0.0, *self.config.retry_delays]
+        for attempt, delay in enumerate(delays, start=1):
+            await asyncio.sleep(delay)
+            try:
+                token, expires_at = await self._fetch()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(
+                    f"{self.name} token refresh failed ({attempt}/{len(delays)}): {e!r}"
+                )
+                if attempt == len(delays):
+                    raise
+                continue
+            self._token, self._expires_at = token, expires_at
+            self._obtained_at = time.time()
+            self.refreshes += 1
+            logger.info(
+                f"{self.name} token refreshed, expires in {self.expires_in:.0f}s"
+            )
+            return token
+
+    async def _run(self) -> None:
+        while True:
+            if self._token is not None:
+                delay = self.expires_in - self.config.refresh_margin
+                delay -= random.uniform(0, self.config.refresh_jitter)
+                # Short-lived tokens must not turn this into a busy loop
+                await asyncio.sleep(max(delay, 1.0))
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.name} token refresh gave up: {e!r}")
+                await asyncio.sleep(self.config.retry_delays[-1])
+
+    def stats(self) -> dict[str, Optional[float]]:
+        return {
+            "token_age": self.token_age,
+            "expires_in": self.expires_in if self._token else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
@@ -0,0 +1,70 @@
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Callable, Optional
+
+import aiohttp
+from aiohttp.payload import AsyncIterablePayload
+
+from src.buffer import AudioBuffer
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# A factory gives a fresh iterator per request, so a retry resends it all
+UploadSource = AudioBuffer | Callable[[], AsyncIterable[bytes]]
+
+
+class StreamPayload(AsyncIterablePayload):
+    """
+    Payload over an async chunk iterator.
+
+    When the size is known it is reported, so the request is sent with
+    Content-Length instead of chunked transfer encoding.
+    """
+
+    def __init__(
+        self, value: AsyncIterable[bytes], size: Optional[int] = None, **kwargs
+    ) -> None:
+        super().__init__(value, **kwargs)
+        self._stream_size = size
+
+    @property
+    def size(self) -> Optional[int]:
+        return self._stream_size
+
+
+async def iter_buffer(buffer: AudioBuffer, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Read a buffer in chunks, off the event loop when it is on disk.
+
+    In-memory chunks are views, spilled ones are copied a chunk at a time
+    in a thread, so page faults of the mmap never block the loop.
+    """
+    for chunk in buffer.iter_chunks(chunk_size):
+        if buffer.spilled:
+            yield await asyncio.to_thread(bytes, chunk)
+        else:
+            yield chunk
+
+
+def multipart_upload(
+    source: UploadSource,
+    name: str,
+    filename: str,
+    size: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> aiohttp.MultipartWriter:
+    """
+    Multipart form with one file field streamed from `source`.
+
+    Memory use does not depend on the payload size. A factory source is
+    called here, an async iterator can be sent once only.
+    """
+    if isinstance(source, AudioBuffer):
+        size = len(source)
+        chunks = iter_buffer(source, chunk_size)
+    else:
+        chunks = source()
+    payload = StreamPayload(chunks, size=size)
+    payload.set_content_disposition("form-data", name=name, filename=filename)
+    form = aiohttp.MultipartWriter("form-data")
+    form.append_payload(payload)
+    return form
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+from typing import Any
+
+import numpy as np
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from src.audio_handler import PASSTHROUGH_WAV, decode_to_pcm
+from src.buffer import AudioBuffer
+from src.handler import Handler
+from src.pcm import TARGET_CHANNELS, TARGET_SAMPLE_RATE, wav_header
+from src.probe import find_wav_data, parse_wav_params
+from src.schemas import Audio, OffsetMap, LazyTranscriptionItem
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceActivityConfig(BaseSettings):
+    enabled: bool = Field(False, alias="VAD_ENABLED")
+    min_silence: float = Field(1.0, alias="VAD_MIN_SILENCE")
+    padding: float = Field(0.2, alias="VAD_PADDING")
+    frame_ms: int = Field(30, alias="VAD_FRAME_MS")
+    margin_db: float = Field(12.0, alias="VAD_MARGIN_DB")
+    min_level_db: float = Field(-50.0, alias="VAD_MIN_LEVEL_DB")
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+
+class VoiceActivityTrimmer(Handler):
+    """
+    Cuts long pauses out of audio before it is sent to STT.
+
+    Frames are classified by energy against an adaptive noise floor;
+    silences longer than `min_silence` are removed, keeping `padding`
+    on both sides. The resulting `Audio` carries an `OffsetMap` so STT
+    timestamps can be mapped back with `restore_timestamps`.
+    """
+
+    class Config(VoiceActivityConfig):
+        name: str = Field(default="VoiceActivityTrimmer")
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.config = self.Config(*args, **kwargs)
+        self._is_running = False
+        self.jobs = 0
+        self.removed_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def start(self) -> None:
+        self._is_running = True
+        logger.info(f"VAD started, enabled={self.enabled}")
+
+    def stop(self) -> None:
+        self._is_running = False
+
+    def handle(self, audio: Audio, *args: Any, **kwargs: Any) -> Audio:
+        if not self._is_running:
+            raise RuntimeError("Handler not started")
+        if not self.enabled:
+            return audio
+
+        decoded = None
+        if parse_wav_params(audio.file) != PASSTHROUGH_WAV:
+            decoded = decode_to_pcm([audio.file])
+        source = decoded if decoded is not None else audio.file
+        try:
+            trimmed = trim_silence(
+                source,
+                min_silence=self.config.min_silence,
+                padding=self.config.padding,
+                frame_ms=self.config.frame_ms,
+                margin_db=self.config.margin_db,
+                min_level_db=self.config.min_level_db,
+            )
+        finally:
+            if decoded is not None:
+                decoded.close()
+
+        if audio.offset_map:
+            # Joined audio already maps back to its files
+            trimmed.offset_map = trimmed.offset_map.then(audio.offset_map)
+        self.jobs += 1
+        self.removed_seconds += trimmed.trimmed_seconds
+        logger.info(
+            f"VAD removed {trimmed.trimmed_seconds:.2f}s of silence "
+            f"(total {self.removed_seconds:.2f}s over {self.jobs} jobs)"
+        )
+        return trimmed
+
+    async def ahandle(self, audio: Audio) -> Audio:
+        """Run `handle` in a thread, numpy and ffmpeg release the GIL"""
+        return await asyncio.to_thread(self.handle, audio)
+
+    def stats(self) -> dict[str, float]:
+        return {"jobs": self.jobs, "removed_seconds": self.removed_seconds}
+
+
+def restore_timestamps(
+    items: list[LazyTranscriptionItem], audio: Audio
+) -> list[LazyTranscriptionItem]:
+    """Map timestamps of a trimmed recording back to the original one"""
+    if not audio.offset_map:
+        return items
+    return [item.remap(audio.offset_map.to_original) for item in items]
+
+
+def split_audio(
+    audio: Audio,
+    chunk_seconds: float,
+    search_seconds: float,
+    frame_ms: int = 30,
+) -> list[tuple[float, Audio]]:
+    """
+    Split audio into 16 kHz mono WAV chunks of about `chunk_seconds`.
+
+    Compressed input is decoded first. Returns (offset, chunk) pairs, the
+    offset is the chunk start in seconds within `audio`.
+    """
+    decoded = None
+    if parse_wav_params(audio.file) != PASSTHROUGH_WAV:
+        decoded = decode_to_pcm([audio.file])
+    try:
+        return split_on_silence(
+            decoded if decoded is not None else audio.file,
+            chunk_seconds,
+            search_seconds,
+            frame_ms,
+        )
+    finally:
+        if decoded is not None:
+            decoded.close()
+
+
+def split_on_silence(
+    wav: AudioBuffer,
+    chunk_seconds: float,
+    search_seconds: float,
+    frame_ms: int = 30,
+) -> list[tuple[float, Audio]]:
+    """
+    Cut a 16 kHz mono s16 WAV at the quietest points near even boundaries.
+
+    Every cut is searched within `search_seconds` of its boundary so words
+    are not split between chunks.
+    """
+    location = find_wav_data(wav)
+    if location is None:
+        raise ValueError("Not a WAV file")
+    offset, size = location
+    view = wav.view()
+    samples = np.frombuffer(view[offset : offset + size - size % 2], dtype="<i2")
+    rate = TARGET_SAMPLE_RATE
+
+    cuts = _silence_cuts(samples, rate, chunk_seconds, search_seconds, frame_ms)
+    chunks = []
+    for start, end in zip([0, *cuts], [*cuts, len(samples)]):
+        output = AudioBuffer()
+        output.write(wav_header((end - start) * 2, rate, TARGET_CHANNELS))
+        output.write(samples[start:end])
+        chunk = Audio(
+            file=output,
+            format="wav",
+            sample_rate=rate,
+            channels_count=TARGET_CHANNELS,
+            duration=(end - start) / rate,
+        )
+        chunks.append((start / rate, chunk))
+    return chunks
+
+
+def _silence_cuts(
+    samples: np.ndarray,
+    rate: int,
+    chunk_seconds: float,
+    search_seconds: float,
+    frame_ms: int,
+    smoothing_ms: int = 300,
+) -> list[int]:
+    """Sample positions to cut at, empty when one chunk is enough"""
+    frame = max(1, rate * frame_ms // 1000)
+    frames = len(samples) // frame
+    chunk_frames = max(1, int(chunk_seconds * 1000 / frame_ms))
+    count = int(np.ceil(frames / chunk_frames))
+    if count < 2:
+        return []
+
+    level_db = _frame_levels(samples[: frames * frame].reshape(frames, frame))
+    window = max(1, smoothing_ms // frame_ms)
+    smooth = np.convolve(level_db, np.ones(window) / window, mode="same")
+    # Windows of neighbouring cuts must not overlap to keep cuts ordered
+    search = min(int(search_seconds * 1000 / frame_ms), frames // count // 2)
+    cuts = []
+    for index in range(1, count):
+        target = index * frames // count
+        low = max(target - search, 1)
+        high = min(target + search, frames - 1)
+        quietest = low + int(np.argmin(smooth[low:high])) if high > low else target
+        cuts.append(quietest * frame)
+    return cuts
+
+
+def trim_silence(
+    wav: AudioBuffer,
+    min_silence: float,
+    padding: float,
+    frame_ms: int = 30,
+    margin_db: float = 12.0,
+    min_level_db: float = -50.0,
+) -> Audio:
+    """
+    Remove silences from a 16 kHz mono s16 WAV.
+
+    Kept intervals are written one by one into a new buffer, so the output
+    spills to disk like any other large payload.
+    """
+    location = find_wav_data(wav)
+    if location is None:
+        raise ValueError("Not a WAV file")
+    offset, size = location
+    view = wav.view()
+    samples = np.frombuffer(view[offset : offset + size - size % 2], dtype="<i2")
+    rate = TARGET_SAMPLE_RATE
+
+    keep = _voiced_intervals(
+        samples, rate, min_silence, padding, frame_ms, margin_db, min_level_db
+    )
+    kept_samples = sum(end - start for start, end in keep)
+
+    output = AudioBuffer()
+    output.write(wav_header(kept_samples * 2, rate, TARGET_CHANNELS))
+    segments = []
+    processed = 0
+    for start, end in keep:
+        output.write(samples[start:end])
+        segments.append((processed / rate, start / rate, (end - start) / rate))
+        processed += end - start
+
+    return Audio(
+        file=output,
+        format="wav",
+        sample_rate=rate,
+        channels_count=TARGET_CHANNELS,
+        offset_map=OffsetMap(segments=segments),
+        trimmed_seconds=(len(samples) - kept_samples) / rate,
+        duration=kept_samples / rate,
+    )
+
+
+def _voiced_intervals(
+    samples: np.ndarray,
+    rate: int,
+    min_silence: float,
+    padding: float,
+    frame_ms: int,
+    margin_db: float,
+    min_level_db: float,
+) -> list[tuple[int, int]]:
+    """
+    Sample ranges to keep; the whole recording if nothing looks like speech.
+    """
+    frame = max(1, rate * frame_ms // 1000)
+    frames = len(samples) // frame
+    if frames == 0:
+        return [(0, len(samples))]
+
+    level_db = _frame_levels(samples[: frames * frame].reshape(frames, frame))
+    noise_floor = np.percentile(level_db, 10)
+    voiced = level_db > max(noise_floor + margin_db, min_level_db)
+    if not voiced.any():
+        return [(0, len(samples))]
+
+    # Runs of silent frames: starts and ends of False stretches
+    edges = np.diff(np.concatenate(([1], voiced.astype(np.int8), [1])))
+    silence_starts = np.flatnonzero(edges == -1)
+    silence_ends = np.flatnonzero(edges == 1)
+
+    min_frames = int(np.ceil(min_silence * 1000 / frame_ms))
+    pad = int(padding * rate)
+    keep = []
+    cursor = 0
+    for start, end in zip(silence_starts, silence_ends):
+        if end - start < min_frames:
+            continue
+        cut_start = start * frame + pad if start > 0 else 0
+        cut_end = end * frame - pad if end < frames else len(samples)
+        if cut_end <= cut_start:
+            continue
+        if cut_start > cursor:
+            keep.append((cursor, cut_start))
+        cursor = cut_end
+    if cursor < len(samples):
+        keep.append((cursor, len(samples)))
+    return keep
+
+
+def _frame_levels(blocks: np.ndarray, batch: int = 4096) -> np.ndarray:
+    """
+    Per-frame energy in dBFS, computed in batches to bound float copies.
+    """
+    levels = np.empty(len(blocks), dtype=np.float32)
+    for start in range(0, len(blocks), batch):
+        chunk = blocks[start : start + batch].astype(np.float32) / 32768.0
+        levels[start : start + batch] = 10 * np.log10(
+            np.mean(np.square(chunk), axis=1) + 1e-12
+        )
+    return levels